@@ -0,0 +1,90 @@
+"""
+Benchmark comparing the compressed JSON map file format with the binary map
+file format.
+
+Generates synthetic maps of various sizes, then saves and loads each map in
+both formats, and reports the file size, the time taken to write the file, the
+time taken to read the file back into serialized map data, and the time taken
+to load the file into tiles (tgmdata.MapLoader, as used by the map editor).
+
+Usage:
+
+    python benchmarks/bench_formats.py [--sizes 1000 10000 50000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from text_game_map_maker import tgmdata
+
+from bench_serialize import build_map
+
+
+FORMATS = [
+    ("json", "tgmdata"),
+    ("binary", tgmdata.BINARY_FILE_SUFFIX)
+]
+
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+def load(filename):
+    with open(filename, 'rb') as fh:
+        loader = tgmdata.MapLoader(fh)
+        for _ in loader.batches():
+            pass
+
+def read(filename):
+    with open(filename, 'rb') as fh:
+        tgmdata.read_file(fh)
+
+def run(sizes, repeat):
+    print("%10s %8s %12s %10s %10s %10s" % ("tiles", "format", "size(bytes)",
+                                             "write(s)", "read(s)", "load(s)"))
+
+    tempdir = tempfile.mkdtemp()
+
+    for num_tiles in sizes:
+        start_tile, tile_dict = build_map(num_tiles, 1)
+        attrs = tgmdata.serialize(start_tile, tile_dict)
+
+        for name, suffix in FORMATS:
+            filename = os.path.join(tempdir, "map.%s" % suffix)
+
+            write_time = best_time(lambda: tgmdata.write_file(attrs, filename), repeat)
+            read_time = best_time(lambda: read(filename), repeat)
+            load_time = best_time(lambda: load(filename), repeat)
+
+            print("%10d %8s %12d %10.4f %10.4f %10.4f"
+                  % (num_tiles, name, os.path.getsize(filename), write_time,
+                     read_time, load_time))
+
+            os.remove(filename)
+
+    os.rmdir(tempdir)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare map file formats")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000],
+                        help="Number of tiles in each generated map")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Number of times to repeat each operation (best time is reported)")
+    args = parser.parse_args()
+
+    run(args.sizes, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark for serializing a map after a few tiles have been edited.
+
+Builds maps of various sizes in a MapModel, and serializes each one once to
+fill the model's cache of serialized tiles. Then a number of tiles are edited,
+and the time taken to serialize the map again is reported, along with the time
+taken to serialize the same map with no cache.
+
+Usage:
+
+    python benchmarks/bench_incremental_save.py [--sizes 1000 10000 50000] [--edits 1 10 100 1000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from text_game_map_maker import tgmdata
+
+from bench_map_model import build_model
+
+
+def edit_tiles(model, positions):
+    model.mark_dirty(positions)
+    for pos in positions:
+        model.tile_at(pos).description = "in an edited room"
+
+def run(sizes, edit_counts, repeat):
+    print("%10s %10s %12s %12s" % ("tiles", "edits", "full(s)", "incremental(s)"))
+
+    for num_tiles in sizes:
+        model, _ = build_model(num_tiles)
+        positions = list(model)
+
+        t0 = time.perf_counter()
+        tgmdata.serialize(model.start_tile(), model.tiles)
+        full_time = time.perf_counter() - t0
+
+        model.serialize()
+
+        for num_edits in edit_counts:
+            if num_edits > num_tiles:
+                continue
+
+            best = None
+            for _ in range(repeat):
+                edit_tiles(model, random.sample(positions, num_edits))
+
+                t0 = time.perf_counter()
+                model.serialize()
+                elapsed = time.perf_counter() - t0
+                best = elapsed if best is None else min(best, elapsed)
+
+            print("%10d %10d %12.4f %12.4f" % (num_tiles, num_edits, full_time, best))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark incremental serialization")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000],
+                        help="Number of tiles in each generated map")
+    parser.add_argument('--edits', type=int, nargs='+', default=[1, 10, 100, 1000],
+                        help="Number of tiles edited before each save")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Number of times to edit and serialize (best time is reported)")
+    args = parser.parse_args()
+
+    run(args.sizes, args.edits, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark for MapModel bulk operations.
+
+Places tiles one at a time onto a square grid, then moves and copies square
+regions of various sizes, and reports the time taken for each operation. The
+same region is then copied many more times, and the time taken by the last
+copy is reported. No display is needed.
+
+Usage:
+
+    python benchmarks/bench_map_model.py [--sizes 1000 10000 50000] [--regions 100 500] [--copies 50]
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from text_game_maker.tile import tile
+
+from text_game_map_maker.map_model import MapModel
+
+
+def build_model(num_tiles):
+    """
+    Build a model holding a square-ish, fully connected grid of tiles
+
+    :param int num_tiles: number of tiles to create
+    :return: tuple of the form (model, side), where side is the number of\
+        columns in the grid
+    """
+    tile._tiles.clear()
+    model = MapModel()
+    side = int(math.ceil(math.sqrt(num_tiles)))
+
+    for i in range(num_tiles):
+        tileobj = tile.Tile("a room", "in a room")
+        tileobj.original_name = tileobj.name
+        tileobj.set_tile_id("tile%d" % i)
+        model.place(divmod(i, side), tileobj)
+
+    model.start_position = (0, 0)
+    return model, side
+
+def region(num_tiles, yoffset=0, xoffset=0):
+    side = int(math.ceil(math.sqrt(num_tiles)))
+    return [(yoffset + y, xoffset + x) for y in range(side) for x in range(side)
+            if (y * side) + x < num_tiles]
+
+def timed(func, *args):
+    t0 = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - t0
+
+def run(sizes, region_sizes, copies):
+    print("%10s %10s %10s %10s %10s %12s" % ("tiles", "region", "place(s)",
+                                             "move(s)", "copy(s)", "last copy(s)"))
+
+    for num_tiles in sizes:
+        for region_size in region_sizes:
+            if region_size > num_tiles:
+                continue
+
+            t0 = time.perf_counter()
+            model, side = build_model(num_tiles)
+            place_time = time.perf_counter() - t0
+
+            # Move a region from the top-left corner to just below the grid,
+            # and copy it from there to just right of the grid
+            src = region(region_size)
+            moved = region(region_size, side + 1, 0)
+            copied = region(region_size, side + 1, side + 1)
+
+            move_time = timed(model.move_region, src, moved)
+            copy_time = timed(model.copy_region, moved, copied)
+
+            # Copy the same region many more times, placing each copy to the
+            # right of the last one
+            region_side = int(math.ceil(math.sqrt(region_size)))
+            for i in range(1, copies):
+                xoffset = side + 1 + (i * (region_side + 1))
+                dest = region(region_size, side + 1, xoffset)
+                last_copy_time = timed(model.copy_region, moved, dest)
+
+            print("%10d %10d %10.4f %10.4f %10.4f %12.4f"
+                  % (num_tiles, region_size, place_time, move_time, copy_time,
+                     last_copy_time))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MapModel")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000],
+                        help="Number of tiles in each generated map")
+    parser.add_argument('--regions', type=int, nargs='+', default=[100, 500],
+                        help="Number of tiles in each moved/copied region")
+    parser.add_argument('--copies', type=int, default=50,
+                        help="Number of times to copy each region")
+    args = parser.parse_args()
+
+    run(args.sizes, args.regions, max(2, args.copies))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark for saving and re-using saved objects.
+
+Builds containers holding a varying number of nested items, and reports the
+time taken to save each container and to get a new instance of it, using
+saved_objects, compared with copying the container with copy.deepcopy (which
+is how saved objects used to be stored and instantiated).
+
+Usage:
+
+    python benchmarks/bench_saved_objects.py [--items 1 10 50 200]
+"""
+
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from text_game_maker.game_objects.items import Item, LargeContainer, Blueprint
+
+from text_game_map_maker import saved_objects
+
+
+def build_container(num_items):
+    """
+    Build a container holding num_items items, half of which are blueprints
+    holding a few ingredients each
+
+    :param int num_items: number of items to put in the container
+    :return: container
+    """
+    container = LargeContainer("a", "chest")
+    container.capacity = num_items
+
+    for i in range(num_items):
+        if i % 2:
+            item = Blueprint("a", "blueprint %d" % i)
+            item.ingredients = [Item("a", "part %d" % j) for j in range(4)]
+        else:
+            item = Item("a", "thing %d" % i)
+
+        container.add_item(item)
+
+    return container
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+def run(item_counts, repeat):
+    print("%8s %14s %14s %14s %14s" % ("items", "deepcopy(ms)", "save(ms)",
+                                        "get(ms)", "get speedup"))
+
+    for num_items in item_counts:
+        container = build_container(num_items)
+        name = saved_objects._obj_name(container)
+
+        copy_time = best_time(lambda: copy.deepcopy(container), repeat)
+        save_time = best_time(lambda: saved_objects.save_object(container), repeat)
+        get_time = best_time(lambda: saved_objects.get_object_by_name(name), repeat)
+
+        print("%8d %14.3f %14.3f %14.3f %13.1fx"
+              % (num_items, copy_time * 1000, save_time * 1000,
+                 get_time * 1000, copy_time / get_time))
+
+        saved_objects.clear_objects()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark saved objects")
+    parser.add_argument('--items', type=int, nargs='+', default=[1, 10, 50, 200],
+                        help="Number of items in each container")
+    parser.add_argument('--repeat', type=int, default=20,
+                        help="Number of times to repeat each operation (best time is reported)")
+    args = parser.parse_args()
+
+    run(args.items, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark for selecting and deselecting cells in the tile grid.
+
+Fills the tile grid with tiles, then repeatedly shift-selects a block of cells
+and deselects it again, and reports the time taken for each. The cost of just
+re-styling the same cells, without any of the editor's selection bookkeeping,
+is reported separately.
+
+Usage:
+
+    python benchmarks/bench_selection.py [--rows 50] [--columns 50] [--cells 1000] [--repeat 10]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PyQt5 import QtWidgets
+
+from bench_zoom import fill_editor
+
+
+def report(name, times):
+    avg = (sum(times) / len(times)) * 1000.0
+    print("%-10s %6d runs, avg. %7.2fms, max. %7.2fms"
+          % (name, len(times), avg, max(times) * 1000.0))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tile grid selection")
+    parser.add_argument('--rows', type=int, default=50, help="Number of rows in tile grid")
+    parser.add_argument('--columns', type=int, default=50, help="Number of columns in tile grid")
+    parser.add_argument('--cells', type=int, default=1000, help="Number of cells to select")
+    parser.add_argument('--repeat', type=int, default=10, help="Number of times to select and deselect")
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication(sys.argv)
+
+    from text_game_map_maker.__main__ import MainWindow
+
+    window = MainWindow(app.primaryScreen())
+    window.resize(1280, 1024)
+    window.show()
+    app.processEvents()
+
+    editor = window.widget
+    fill_editor(editor, args.rows, args.columns)
+    app.processEvents()
+
+    cells = args.cells
+    buttons = [editor.buttonAtPosition(*divmod(i, args.columns))
+               for i in range(min(cells, args.rows * args.columns))]
+
+    # Somewhere to move the selection to when deselecting
+    away = editor.buttonAtPosition(args.rows - 1, args.columns - 1)
+
+    select_times = []
+    deselect_times = []
+    style_times = []
+
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        editor.setSelectedPosition(buttons[0])
+        for button in buttons[1:]:
+            editor.addSelectedPosition(button)
+
+        app.processEvents()
+        select_times.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        editor.setSelectedPosition(away)
+        app.processEvents()
+        deselect_times.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        for button in buttons:
+            button.setStyle(selected=True)
+
+        for button in buttons:
+            button.setStyle(selected=False)
+
+        app.processEvents()
+        style_times.append(time.perf_counter() - t0)
+
+    print("%d cells" % len(buttons))
+    report("select", select_times)
+    report("deselect", deselect_times)
+    report("restyle", style_times)
+
+if __name__ == "__main__":
+    main()
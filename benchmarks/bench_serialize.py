@@ -0,0 +1,105 @@
+"""
+Benchmark for tgmdata.serialize.
+
+Generates synthetic maps of various sizes, split into a varying number of
+disconnected islands, and reports the time taken to serialize each map.
+
+Usage:
+
+    python benchmarks/bench_serialize.py [--sizes 1000 10000 50000] [--islands 1 10 100]
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from text_game_maker.tile import tile
+
+from text_game_map_maker import tgmdata
+
+
+def build_map(num_tiles, num_islands):
+    """
+    Build a synthetic map made of square-ish, fully connected islands of
+    tiles. Islands are laid out side by side, separated by an empty column.
+
+    :param int num_tiles: total number of tiles to create
+    :param int num_islands: number of disconnected islands to split tiles into
+    :return: tuple of the form (start_tile, tile_dict)
+    """
+    tile._tiles.clear()
+    tile_dict = {}
+    per_island = int(math.ceil(num_tiles / float(num_islands)))
+    side = int(math.ceil(math.sqrt(per_island)))
+    created = 0
+    xoffset = 0
+
+    for _ in range(num_islands):
+        island_count = min(per_island, num_tiles - created)
+        if island_count <= 0:
+            break
+
+        for i in range(island_count):
+            y, x = divmod(i, side)
+            pos = (y, xoffset + x)
+            tileobj = tile.Tile("a room", "in a room")
+            tileobj.original_name = tileobj.name
+
+            # Map editor always uses string tile IDs
+            tileobj.set_tile_id("tile%d" % (created + i))
+
+            north = tile_dict.get((y - 1, pos[1]))
+            west = tile_dict.get((y, pos[1] - 1)) if x > 0 else None
+
+            if north is not None:
+                tileobj.north = north
+                north.south = tileobj
+
+            if west is not None:
+                tileobj.west = west
+                west.east = tileobj
+
+            tile_dict[pos] = tileobj
+
+        created += island_count
+        xoffset += side + 1
+
+    return tile_dict[(0, 0)], tile_dict
+
+def run(sizes, island_counts, repeat):
+    print("%10s %10s %12s" % ("tiles", "islands", "serialize(s)"))
+
+    for num_tiles in sizes:
+        for num_islands in island_counts:
+            if num_islands > num_tiles:
+                continue
+
+            start_tile, tile_dict = build_map(num_tiles, num_islands)
+            best = None
+
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                tgmdata.serialize(start_tile, tile_dict)
+                elapsed = time.perf_counter() - t0
+                best = elapsed if best is None else min(best, elapsed)
+
+            print("%10d %10d %12.4f" % (num_tiles, num_islands, best))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tgmdata.serialize")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000],
+                        help="Number of tiles in each generated map")
+    parser.add_argument('--islands', type=int, nargs='+', default=[1, 10, 100, 1000],
+                        help="Number of disconnected islands in each generated map")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Number of times to serialize each map (best time is reported)")
+    args = parser.parse_args()
+
+    run(args.sizes, args.islands, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark for zooming the tile grid.
+
+Fills the tile grid with tiles, then steps through every zoom level and
+reports the time taken per zoom step, both for previewing a zoom step (what
+happens on each mouse wheel event) and for re-laying out the grid at the new
+zoom level (what happens once a burst of wheel events is over).
+
+Usage:
+
+    python benchmarks/bench_zoom.py [--rows 50] [--columns 50]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PyQt5 import QtWidgets
+
+from bench_serialize import build_map
+
+
+def fill_editor(editor, rows, columns):
+    start_tile, tile_dict = build_map(rows * columns, 1)
+    positions = {}
+    for pos in tile_dict:
+        positions[tile_dict[pos].tile_id] = pos
+
+    editor.setGridSize(rows, columns)
+    editor.drawTileMap(start_tile, positions)
+    editor.startTilePosition = positions[start_tile.tile_id]
+
+def time_steps(editor, step_func):
+    from text_game_map_maker import map_editor
+
+    times = []
+    editor.setDefaultZoomLevel()
+
+    while True:
+        old_size = map_editor.ZoomLevel.button_size
+        t0 = time.perf_counter()
+        step_func()
+        editor.tileGrid.repaint()
+        times.append(time.perf_counter() - t0)
+
+        if map_editor.ZoomLevel.button_size == old_size:
+            times.pop()
+            break
+
+    return times
+
+def report(name, times):
+    avg = (sum(times) / len(times)) * 1000.0
+    print("%-10s %6d steps, avg. %7.2fms, max. %7.2fms"
+          % (name, len(times), avg, max(times) * 1000.0))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tile grid zooming")
+    parser.add_argument('--rows', type=int, default=50, help="Number of rows in tile grid")
+    parser.add_argument('--columns', type=int, default=50, help="Number of columns in tile grid")
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication(sys.argv)
+
+    from text_game_map_maker.__main__ import MainWindow
+
+    window = MainWindow(app.primaryScreen())
+    window.resize(1280, 1024)
+    window.show()
+    app.processEvents()
+
+    editor = window.widget
+    fill_editor(editor, args.rows, args.columns)
+    app.processEvents()
+
+    def preview_step():
+        editor.zoom_anchor = editor.tileGrid.rect().center()
+        editor.decreaseZoomLevel(False, deferred=True)
+
+    def relayout_step():
+        editor.decreaseZoomLevel(False)
+
+    editor.tileGrid.paint_counter.reset()
+    report("preview", time_steps(editor, preview_step))
+    editor.applyDeferredZoom()
+    report("relayout", time_steps(editor, relayout_step))
+    print("paints:   ", editor.tileGrid.paint_counter)
+
+if __name__ == "__main__":
+    main()
@@ -131,6 +131,10 @@ class MainWindow(QtWidgets.QMainWindow):
         self.zoomResetAction.setStatusTip("Reset magnification level of tile grid view to default")
         self.zoomResetAction.triggered.connect(self.widget.setDefaultZoomLevel)
 
+        self.gridSizeAction = QtWidgets.QAction("Grid size", self)
+        self.gridSizeAction.setStatusTip("Change the number of rows and columns in the tile grid")
+        self.gridSizeAction.triggered.connect(self.widget.gridSizeButtonClicked)
+
         # Help menu actions
         self.aboutAction = QtWidgets.QAction("About", self)
         self.aboutAction.triggered.connect(self.showAboutWindow)
@@ -164,6 +168,7 @@ class MainWindow(QtWidgets.QMainWindow):
         viewMenu.addAction(self.zoomInAction)
         viewMenu.addAction(self.zoomOutAction)
         viewMenu.addAction(self.zoomResetAction)
+        viewMenu.addAction(self.gridSizeAction)
 
         helpMenu = menu.addMenu("Help")
         helpMenu.addAction(self.aboutAction)
@@ -179,6 +184,8 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def closeEvent(self, event):
         if self.widget.warningBeforeQuit():
+            # Don't exit with a save still in progress
+            self.widget.waitForSave()
             event.accept()
         else:
             event.ignore()
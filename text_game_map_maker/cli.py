@@ -0,0 +1,360 @@
+"""
+Command-line tools for working with map files, without starting the map
+editor. Nothing here imports PyQt5, so these tools can run on machines with no
+display.
+
+Usage:
+
+    python -m text_game_map_maker.cli validate [-r] [-j JOBS] PATH [PATH ...]
+    python -m text_game_map_maker.cli upgrade [-r] [-j JOBS] [-n] PATH [PATH ...]
+    python -m text_game_map_maker.cli resave [-r] [-j JOBS] [-o DIR] PATH [PATH ...]
+    python -m text_game_map_maker.cli convert [-r] [-j JOBS] [-o DIR] --to FORMAT PATH [PATH ...]
+    python -m text_game_map_maker.cli play [-r] [-j JOBS] [-o DIR] --script FILE PATH [PATH ...]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+
+from text_game_maker.tile import tile
+
+from text_game_map_maker import tgmdata, tgmbin
+
+
+MAP_FILE_SUFFIXES = (
+    "." + tgmdata.JSON_FILE_SUFFIX,
+    "." + tgmdata.BINARY_FILE_SUFFIX
+)
+
+FORMAT_SUFFIXES = {
+    "json": tgmdata.JSON_FILE_SUFFIX,
+    "binary": tgmdata.BINARY_FILE_SUFFIX
+}
+
+# Suffix of files holding the output of a scripted playthrough
+TRANSCRIPT_FILE_SUFFIX = "transcript.txt"
+
+
+class MapFileError(Exception):
+    pass
+
+
+class FileResult(object):
+    """
+    Outcome of running a command on a single map file
+    """
+    def __init__(self, filename, message, elapsed, error=False):
+        self.filename = filename
+        self.message = message
+        self.elapsed = elapsed
+        self.error = error
+
+
+def find_map_files(paths, recursive=False):
+    """
+    Find all map files in a list of files and directories. Files listed
+    explicitly are always included, files in directories are included only if
+    they have a map file suffix
+
+    :param list paths: list of file and directory names
+    :param bool recursive: if True, search sub-directories
+    :return: generator yielding map filenames
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+
+        for dirpath, dirnames, filenames in os.walk(path):
+            for filename in sorted(filenames):
+                if filename.endswith(MAP_FILE_SUFFIXES):
+                    yield os.path.join(dirpath, filename)
+
+            if not recursive:
+                break
+
+            dirnames.sort()
+
+def file_is_binary(filename):
+    with open(filename, 'rb') as fh:
+        return tgmbin.is_binary(fh.read(len(tgmbin.MAGIC)))
+
+def output_filename(filename, output_dir=None, suffix=None):
+    """
+    Build the name of the file to write when processing a map file
+
+    :param str filename: name of the map file being processed
+    :param str output_dir: directory to write to. If None, the output file is\
+        written alongside the input file
+    :param str suffix: suffix for the output file, without the leading '.'.\
+        If None, the suffix of the input file is kept
+    :return: output filename
+    :rtype: str
+    """
+    if suffix is not None:
+        filename = os.path.splitext(filename)[0] + "." + suffix
+
+    if output_dir is not None:
+        filename = os.path.join(output_dir, os.path.basename(filename))
+
+    return filename
+
+def load_map(filename):
+    """
+    Load a map file of either format, migrating it to the current version and
+    building all of its tiles, and check that the tile positions are sane
+
+    :param str filename: name of map file to load
+    :return: tuple of the form (start_tile, tile_dict), where tile_dict maps\
+        (y, x) positions to tiles, in the same form used by tgmdata.serialize
+    :rtype: tuple
+    """
+    with open(filename, 'rb') as fh:
+        loader = tgmdata.MapLoader(fh)
+        for _ in loader.batches():
+            pass
+
+    tile_dict = {}
+    for tile_id in loader.positions:
+        tileobj = tile.get_tile_by_id(tile_id)
+        if tileobj is None:
+            raise MapFileError("position given for unknown tile '%s'" % tile_id)
+
+        pos = tuple(loader.positions[tile_id])
+        if pos in tile_dict:
+            raise MapFileError("tiles '%s' and '%s' are both at position %s"
+                               % (tile_dict[pos].tile_id, tile_id, pos))
+
+        tile_dict[pos] = tileobj
+
+    if loader.start_tile.tile_id not in loader.positions:
+        raise MapFileError("start tile '%s' has no position"
+                           % loader.start_tile.tile_id)
+
+    return loader.start_tile, tile_dict
+
+def upgrade_file(filename, dry_run=False):
+    """
+    Migrate a map file to the current version, in place. The file keeps its
+    format (binary or compressed JSON)
+
+    :param str filename: name of map file to upgrade
+    :param bool dry_run: if True, don't write the upgraded file
+    :return: tuple of the form (old_version, new_version). Versions are the\
+        same if the file was not upgraded
+    :rtype: tuple
+    """
+    with open(filename, 'rb') as fh:
+        binary = tgmbin.is_binary(fh.read(len(tgmbin.MAGIC)))
+        fh.seek(0)
+        attrs = tgmdata.read_file(fh)
+
+    old_version = attrs.get(tgmdata.VERSION_KEY, None)
+    if not tgmdata.migration_path(old_version):
+        return old_version, old_version
+
+    attrs = tgmdata.migrate_tgmdata_version(attrs)
+
+    if not dry_run:
+        if binary:
+            tgmdata.write_binary(attrs, filename)
+        else:
+            tgmdata.write_compressed(attrs, filename)
+
+    return old_version, attrs[tgmdata.VERSION_KEY]
+
+def validate_command(filename, args):
+    start_tile, tile_dict = load_map(filename)
+    return "ok, %d tiles" % len(tile_dict)
+
+def upgrade_command(filename, args):
+    old_version, new_version = upgrade_file(filename, args.dry_run)
+
+    if old_version == new_version:
+        if old_version == tgmdata.VERSION:
+            return "up to date"
+
+        raise MapFileError("unknown version %s, not upgraded" % old_version)
+
+    return ("upgraded from %s to %s%s"
+            % (old_version or "(no version)", new_version,
+               " (dry run)" if args.dry_run else ""))
+
+def resave_command(filename, args):
+    outfile = output_filename(filename, args.output_dir)
+
+    start_tile, tile_dict = load_map(filename)
+    attrs = tgmdata.serialize(start_tile, tile_dict)
+
+    # Keep the format of the input file, regardless of its suffix
+    if file_is_binary(filename):
+        tgmdata.write_binary(attrs, outfile)
+    else:
+        tgmdata.write_compressed(attrs, outfile)
+
+    return "wrote %d tiles to %s" % (len(tile_dict), outfile)
+
+def convert_command(filename, args):
+    outfile = output_filename(filename, args.output_dir, FORMAT_SUFFIXES[args.to])
+    if os.path.abspath(outfile) == os.path.abspath(filename):
+        return "already %s" % args.to
+
+    tgmbin.convert(filename, outfile)
+    return "converted to %s" % outfile
+
+def play_command(filename, args):
+    # Only this command runs games, so only this command needs the game
+    # runtime from text_game_maker
+    from text_game_map_maker import playtest
+
+    with open(filename, 'rb') as fh:
+        attrs = tgmdata.migrate_tgmdata_version(tgmdata.read_file(fh))
+
+    playthrough = playtest.Playthrough(playtest.read_script(args.script))
+    playthrough.run(json.dumps(attrs))
+
+    if args.output_dir is not None:
+        outfile = output_filename(filename, args.output_dir, TRANSCRIPT_FILE_SUFFIX)
+        with open(outfile, 'w') as fh:
+            fh.write("\n".join(playthrough.output) + "\n")
+
+    if playthrough.startup_time is None:
+        raise MapFileError("game exited before the map was loaded")
+
+    latencies = playthrough.latencies or [0.0]
+    message = ("%d/%d commands, startup %.3fs, avg. %.2fms, max. %.2fms, "
+               "%.1f commands/s" % (len(playthrough.latencies),
+                                    len(playthrough.commands),
+                                    playthrough.startup_time,
+                                    (sum(latencies) / len(latencies)) * 1000.0,
+                                    max(latencies) * 1000.0,
+                                    playthrough.commands_per_second()))
+
+    if len(playthrough.latencies) < len(playthrough.commands):
+        raise MapFileError("game exited early, " + message)
+
+    return message
+
+def run_command(job):
+    """
+    Run a command on a single map file, timing it and catching any errors.
+    Runs in a worker process when more than one job is used
+
+    :param tuple job: tuple of the form (command, filename, args)
+    :return: result of running the command
+    :rtype: FileResult
+    """
+    command, filename, args = job
+    start = time.time()
+
+    try:
+        message = command(filename, args)
+    except Exception as e:
+        return FileResult(filename, "error: %s" % e, time.time() - start, True)
+
+    return FileResult(filename, message, time.time() - start)
+
+def run_jobs(command, args):
+    """
+    Run a command on all map files named by the command-line arguments,
+    printing the result for each file as it finishes
+
+    :param command: function to run on each file. Takes a filename and the\
+        parsed command-line arguments, returns a message to print and raises\
+        an exception on failure
+    :param args: parsed command-line arguments
+    :return: exit status
+    :rtype: int
+    """
+    filenames = list(find_map_files(args.paths, args.recursive))
+    jobs = [(command, filename, args) for filename in filenames]
+    processes = min(args.jobs or multiprocessing.cpu_count(), len(jobs))
+
+    if (args.output_dir is not None) and (not os.path.isdir(args.output_dir)):
+        os.makedirs(args.output_dir)
+
+    errors = 0
+    total_time = 0.0
+    start = time.time()
+
+    if processes > 1:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap_unordered(run_command, jobs)
+    else:
+        pool = None
+        results = (run_command(job) for job in jobs)
+
+    try:
+        for result in results:
+            print("%s: %s (%.3fs)" % (result.filename, result.message,
+                                      result.elapsed))
+            total_time += result.elapsed
+            if result.error:
+                errors += 1
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    print("%d file(s), %d error(s), %.3fs total, %.3fs elapsed"
+          % (len(jobs), errors, total_time, time.time() - start))
+
+    return 1 if errors else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Text game map maker "
+                                     "command-line tools")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('paths', nargs='+', help="Map files, or directories "
+                        "containing map files")
+    common.add_argument('-r', '--recursive', action='store_true',
+                        help="Search directories recursively")
+    common.add_argument('-j', '--jobs', type=int, default=0, help="Number of "
+                        "files to process in parallel (default: one per CPU)")
+
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument('-o', '--output-dir', default=None, help="Directory "
+                        "to write output files to (default: alongside the "
+                        "input files)")
+
+    validate_parser = subparsers.add_parser('validate', parents=[common],
+        help="Load map files and check that they are valid")
+    validate_parser.set_defaults(func=validate_command, output_dir=None)
+
+    upgrade_parser = subparsers.add_parser('upgrade', parents=[common],
+        help="Migrate map files to the current version, in place")
+    upgrade_parser.add_argument('-n', '--dry-run', action='store_true',
+                                help="Don't write upgraded files")
+    upgrade_parser.set_defaults(func=upgrade_command, output_dir=None)
+
+    resave_parser = subparsers.add_parser('resave', parents=[common, output],
+        help="Load map files and serialize them again, in the same format")
+    resave_parser.set_defaults(func=resave_command)
+
+    convert_parser = subparsers.add_parser('convert', parents=[common, output],
+        help="Convert map files between the binary and compressed JSON formats")
+    convert_parser.add_argument('-t', '--to', required=True,
+                                choices=sorted(FORMAT_SUFFIXES),
+                                help="Format to convert to")
+    convert_parser.set_defaults(func=convert_command)
+
+    play_parser = subparsers.add_parser('play', parents=[common],
+        help="Play map files with no player, entering commands from a script")
+    play_parser.add_argument('-s', '--script', required=True, help="File "
+                             "containing commands to enter, one per line")
+    play_parser.add_argument('-o', '--output-dir', default=None, help="Directory "
+                             "to write the output of each game to (default: "
+                             "output is not written)")
+    play_parser.set_defaults(func=play_command)
+
+    args = parser.parse_args()
+    return run_jobs(args.func, args)
+
+if __name__ == "__main__":
+    sys.exit(main())
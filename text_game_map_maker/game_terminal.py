@@ -1,22 +1,62 @@
-import queue
 import threading
 
 from PyQt5 import QtWidgets, QtCore, QtGui
 
-from text_game_maker.builder.map_builder import StopWaitingForInput, clear_instance
-from text_game_maker.utils import utils
-from text_game_maker.utils.runner import MapRunner, run_map_from_class
+from text_game_map_maker import playtest
+
+
+# Maximum number of lines kept in the game terminal output window
+DEFAULT_MAX_LINES = 10000
+
+# Minimum interval between writes to the game terminal output window
+FLUSH_INTERVAL_MS = 16
+
 
 class UpdateSignal(QtCore.QObject):
-	signal = QtCore.pyqtSignal(object)
+	signal = QtCore.pyqtSignal()
+
+class OutputBuffer(object):
+    """
+    Thread-safe buffer for lines of game output. Lines can be written from any
+    thread, and are taken out all at once by the GUI thread.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lines = []
+
+    def write(self, text):
+        """
+        Add a line to the buffer
+
+        :param str text: line to add
+        :return: True if the buffer was empty before this line was added
+        :rtype: bool
+        """
+        with self.lock:
+            self.lines.append(text)
+            return len(self.lines) == 1
+
+    def take(self):
+        """
+        Remove and return all lines in the buffer
+
+        :return: buffered lines, oldest first
+        :rtype: [str]
+        """
+        with self.lock:
+            lines = self.lines
+            self.lines = []
+
+        return lines
 
 class GameTerminal(QtWidgets.QDialog):
-    def __init__(self, parent, map_data):
+    def __init__(self, parent, map_data, max_lines=DEFAULT_MAX_LINES):
         super(GameTerminal, self).__init__(parent)
 
         self.inputWidget = QtWidgets.QLineEdit()
-        self.outputWidget = QtWidgets.QTextEdit()
+        self.outputWidget = QtWidgets.QPlainTextEdit()
         self.outputWidget.setReadOnly(True)
+        self.outputWidget.setMaximumBlockCount(max_lines)
         self.outputWidget.setFont(QtGui.QFont("Courier", 12))
 
         self.inputButton = QtWidgets.QPushButton()
@@ -35,47 +75,77 @@ class GameTerminal(QtWidgets.QDialog):
         self.setLayout(mainLayout)
         self.setWindowTitle("Game Terminal")
 
-        utils.set_printfunc(self.game_terminal_printfunc)
-        utils.set_inputfunc(self.game_terminal_inputfunc)
+        # Output from the game process is buffered, and written to the output
+        # window at most once per FLUSH_INTERVAL_MS
+        self.outputBuffer = OutputBuffer()
+        self.flushTimer = QtCore.QTimer(self)
+        self.flushTimer.setSingleShot(True)
+        self.flushTimer.setInterval(FLUSH_INTERVAL_MS)
+        self.flushTimer.timeout.connect(self.flushOutput)
 
         self.updateSignal = UpdateSignal()
-        self.updateSignal.signal.connect(self.appendText)
+        self.updateSignal.signal.connect(self.flushTimer.start)
+
+        self.readySignal = UpdateSignal()
+        self.readySignal.signal.connect(self.gameReady)
 
-        self.inputQueue = queue.Queue()
-        self.game_thread = threading.Thread(target=self.run_game, args=(map_data,))
-        self.game_thread.daemon = False
-        self.game_thread.start()
+        # The game runs in its own process, and a thread in this process
+        # waits for messages from it
+        self.playtest = playtest.Playtest(map_data)
+        self.reader_thread = threading.Thread(target=self.read_game_messages)
+        self.reader_thread.daemon = True
+        self.reader_thread.start()
 
     def closeEvent(self, event):
-        self.inputQueue.put(StopWaitingForInput())
-        clear_instance()
-        self.game_thread.join()
+        self.stopGame()
         event.accept()
 
+    def reject(self):
+        self.stopGame()
+        super(GameTerminal, self).reject()
+
+    def stopGame(self):
+        self.playtest.stop()
+        self.reader_thread.join()
+        self.playtest.close()
+
+    def gameReady(self):
+        self.setWindowTitle("Game Terminal (started in %.2fs)"
+                            % self.playtest.startup_time)
+
     def inputButtonClicked(self):
         text = self.inputWidget.text()
-        self.inputQueue.put(text)
+        self.playtest.send_input(text)
         self.inputWidget.clear()
         self.game_terminal_printfunc("(%s)" % text)
 
-    def run_game(self, map_data):
-        class GameTerminalMapRunner(MapRunner):
-            def build_map(self, builder):
-                builder.load_map_data_from_string(map_data)
-                builder.set_input_prompt("")
+    def read_game_messages(self):
+        while True:
+            try:
+                msgtype, data = self.playtest.receive()
+            except EOFError:
+                # Game process has exited
+                return
 
-        run_map_from_class(GameTerminalMapRunner)
-
-    def game_terminal_inputfunc(self, prompt):
-        self.game_terminal_printfunc("> ")
-        return self.inputQueue.get()
+            if msgtype == playtest.MSG_OUTPUT:
+                self.game_terminal_printfunc(data)
+            elif msgtype == playtest.MSG_READY:
+                self.readySignal.signal.emit()
 
     def game_terminal_printfunc(self, text):
-        self.updateSignal.signal.emit(text)
-
-    def appendText(self, text):
-        self.outputWidget.append(text)
-        self.outputWidget.ensureCursorVisible()
+        # Only the first line written to an empty buffer needs to wake up
+        # the GUI thread, the rest will be picked up by the same flush
+        if self.outputBuffer.write(text):
+            self.updateSignal.signal.emit()
+
+    def flushOutput(self):
+        lines = self.outputBuffer.take()
+        if not lines:
+            return
+
+        self.outputWidget.appendPlainText('\n'.join(lines))
+        scrollbar = self.outputWidget.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
 
     def sizeHint(self):
         return QtCore.QSize(800, 600)
@@ -1,17 +1,20 @@
 import os
 import json
 import zlib
-import copy
+import threading
 import traceback
 
 from PyQt5 import QtWidgets, QtCore, QtGui
 
 from text_game_map_maker.utils import yesNoDialog, errorDialog
-from text_game_map_maker import forms, scrollarea, tgmdata
+from text_game_map_maker import forms, scrollarea, tgmdata, saved_objects
+from text_game_map_maker.tile_positions import get_tile_positions, normalize_positions
 from text_game_map_maker.door_editor import DoorEditor
 from text_game_map_maker.game_terminal import GameTerminal
 from text_game_map_maker.object_browsers import TileItemBrowser, SavedItemBrowser
 from text_game_map_maker import tile_button
+from text_game_map_maker.tile_grid import TileGrid
+from text_game_map_maker.map_model import MapModel
 from text_game_map_maker.qt_auto_form import QtAutoForm
 from text_game_maker.game_objects import __object_model_version__ as obj_version
 
@@ -29,6 +32,9 @@ from text_game_maker.player import player
 NUM_BUTTON_ROWS = 50
 NUM_BUTTON_COLUMNS = 50
 
+# Max. number of rows/columns the tile grid can be resized to
+MAX_GRID_SIZE = 10000
+
 DEFAULT_WINDOW_WIDTH = 500
 DEFAULT_WINDOW_HEIGHT = 400
 
@@ -48,9 +54,19 @@ MAX_FONT_SIZE = 25
 
 SCROLL_UNITS_PER_CLICK = 120
 
-MAP_BUILDER_SAVE_FILE_SUFFIX = "tgmdata"
+# Time (in milliseconds) to wait after the last mouse wheel event, before
+# re-laying out the tile grid at the new zoom level. Until then, zoom changes
+# are previewed by scaling the rendered grid
+ZOOM_DEBOUNCE_MS = 150
+
+MAP_BUILDER_SAVE_FILE_SUFFIX = tgmdata.JSON_FILE_SUFFIX
+
+# Max. number of conflicting tile positions listed when loading a saved game file
+MAX_REPORTED_CONFLICTS = 10
 
-_tiles = {}
+# Time (in milliseconds) that loading a map file must take before a progress
+# dialog is shown
+LOAD_PROGRESS_DELAY_MS = 500
 
 _move_map = {
     'north': (-1, 0),
@@ -64,39 +80,9 @@ class ZoomLevel(object):
     button_size = DEFAULT_BUTTON_SIZE
     font_size = DEFAULT_FONT_SIZE
 
-def getTilePositions(start_tile):
-    positions = {}
-    seen = []
-    pos = (0, 0)
-    tilestack = [(start_tile, None, None)]
-
-    while tilestack:
-        curr, newpos, movedir = tilestack.pop(0)
-        if newpos is not None:
-            pos = newpos
-
-        if curr in seen:
-            continue
-
-        seen.append(curr)
-
-        if movedir is not None:
-            xinc, yinc = _move_map[movedir]
-            oldx, oldy = pos
-            newx, newy = oldx + xinc, oldy + yinc
-            pos = (newx, newy)
-
-        if curr.is_door():
-            curr = curr.replacement_tile
-
-        positions[curr.tile_id] = pos
-
-        for direction in _move_map:
-            n = getattr(curr, direction)
-            if n:
-                tilestack.append((n, pos, direction))
-
-    return positions
+class SaveFinishedSignal(QtCore.QObject):
+    # Emitted by the save thread with the filename, and an error message or None
+    signal = QtCore.pyqtSignal(object, object)
 
 # Set checkbox state without triggering the stateChanged signal
 def _silent_checkbox_set(checkbox, value, handler):
@@ -105,6 +91,9 @@ def _silent_checkbox_set(checkbox, value, handler):
     checkbox.stateChanged.connect(handler)
 
 class MapEditor(QtWidgets.QDialog):
+    # Emitted while loading a map file, with the number of bytes read so far
+    loadProgress = QtCore.pyqtSignal(int)
+
     def __init__(self, primaryScreen, mainWindow):
         super(MapEditor, self).__init__()
 
@@ -117,6 +106,13 @@ class MapEditor(QtWidgets.QDialog):
         self.tracking_tile_button_enter = False
         self.group_mask = []
 
+        # Tiles on the grid, and the links between them
+        self.model = MapModel()
+
+        # Serialized map data for playtesting, None if the map has been edited
+        # since it was last serialized
+        self.playtest_data = None
+
         screensize = self.primary_screen.size()
         self.screen_width = screensize.width()
         self.screen_height = screensize.height()
@@ -129,43 +125,47 @@ class MapEditor(QtWidgets.QDialog):
 
         # Build scrollable grid area
         self.scrollArea = scrollarea.ScrollArea(self)
-        self.scrollArea.setWidgetResizable(True)
-        self.scrollAreaWidgetContents = QtWidgets.QWidget()
+        self.scrollArea.setWidgetResizable(False)
         self.scroll_offset = 0
 
-        self.gridLayout = QtWidgets.QGridLayout(self.scrollAreaWidgetContents)
-        self.gridLayout.setHorizontalSpacing(2)
-        self.gridLayout.setVerticalSpacing(2)
-        self.scrollArea.setWidget(self.scrollAreaWidgetContents)
-        self.gridAreaLayout.addWidget(self.scrollArea)
-
-        self.font = QtGui.QFont()
-        self.font.setPointSize(ZoomLevel.font_size)
-        self.font.setFamily("Arial")
-
         self.mainLayout.addLayout(self.buttonAreaLayout)
         self.mainLayout.addLayout(self.gridAreaLayout)
         self.selectedPositions = []
         self.selectedPosition = None
-        self.startTilePosition = None
+
+        # Same positions as selectedPositions, for fast lookups
+        self.selectedPositionSet = set()
 
         self.rows = NUM_BUTTON_ROWS
         self.columns = NUM_BUTTON_COLUMNS
 
         tile_button.TileButton.set_dimensions(ZoomLevel.button_size,
                                               ZoomLevel.button_size)
-        for i in range(self.rows):
-            for j in range(self.columns):
-                btn = tile_button.TileButton(self)
 
-                btn.setFont(self.font)
-                btn.setAttribute(QtCore.Qt.WA_StyledBackground)
-                btn.setFixedSize(ZoomLevel.button_size, ZoomLevel.button_size)
-                btn.installEventFilter(btn)
-                self.gridLayout.addWidget(btn, i, j)
+        # Tile grid only draws the cells that are visible, so creating it
+        # costs the same regardless of the number of rows and columns
+        self.tileGrid = TileGrid(self, self.rows, self.columns, ZoomLevel.button_size)
+        self.tileGrid.setCellSize(ZoomLevel.button_size, ZoomLevel.font_size)
+        self.scrollArea.setWidget(self.tileGrid)
+        self.gridAreaLayout.addWidget(self.scrollArea)
+
+        # Bursts of mouse wheel events are collapsed into a single re-layout
+        # of the tile grid, which happens when this timer expires
+        self.zoom_anchor = None
+        self.zoomTimer = QtCore.QTimer(self)
+        self.zoomTimer.setSingleShot(True)
+        self.zoomTimer.timeout.connect(self.applyDeferredZoom)
 
-        # Enable mouse tracking on scrollarea and all children
-        self.scrollArea.setMouseTracking(True)
+        # Save files are compressed and written by a worker thread. If the map
+        # is saved again while a save is in progress, the newer snapshot is
+        # held here and written once the running save finishes
+        self.save_thread = None
+        self.pending_save = None
+        self.saveFinishedSignal = SaveFinishedSignal()
+        self.saveFinishedSignal.signal.connect(self.onSaveFinished)
+
+        # Content can move under the cursor while auto-scrolling
+        self.scrollArea.autoScrolled.connect(self.tileGrid.updateHovering)
 
         # Set up shortcuts for arrow keys
         QtWidgets.QShortcut(QtGui.QKeySequence("right"), self, self.rightKeyPress)
@@ -177,6 +177,15 @@ class MapEditor(QtWidgets.QDialog):
         QtWidgets.QShortcut(QtGui.QKeySequence("Shift+up"), self, self.shiftUpKeyPress)
         QtWidgets.QShortcut(QtGui.QKeySequence("Shift+down"), self, self.shiftDownKeyPress)
 
+    @property
+    def startTilePosition(self):
+        return self.model.start_position
+
+    @startTilePosition.setter
+    def startTilePosition(self, pos):
+        self.model.start_position = pos
+        self.playtest_data = None
+
     def moveSelection(self, y_move, x_move):
         if self.selectedPosition is None:
             return
@@ -184,8 +193,8 @@ class MapEditor(QtWidgets.QDialog):
         y, x = self.selectedPosition
         newpos = (y + y_move, x + x_move)
 
-        if ((newpos[0] < 0) or (newpos[0] >= self.columns) or
-            (newpos[1] < 0) or (newpos[1] >= self.rows)):
+        if ((newpos[0] < 0) or (newpos[0] >= self.rows) or
+            (newpos[1] < 0) or (newpos[1] >= self.columns)):
             return
 
         button = self.buttonAtPosition(*newpos)
@@ -199,6 +208,7 @@ class MapEditor(QtWidgets.QDialog):
                 b.setStyle(selected=False, start=is_start)
 
             self.selectedPositions = []
+            self.selectedPositionSet.clear()
 
     def shiftArrowKeyPress(self, direction):
         if self.tracking_tile_button_enter:
@@ -211,10 +221,10 @@ class MapEditor(QtWidgets.QDialog):
         yd, xd = _move_map[direction]
         newy, newx = y + yd, x + xd
 
-        if (0 <= newy < NUM_BUTTON_ROWS) and (0 <= newx < NUM_BUTTON_COLUMNS):
+        if (0 <= newy < self.rows) and (0 <= newx < self.columns):
             button = self.buttonAtPosition(newy, newx)
             self.addSelectedPosition(button)
-            self.scrollArea.ensureWidgetVisible(button)
+            self.ensureButtonVisible(button)
 
     def arrowKeyPress(self, direction):
         if self.selectedPositions:
@@ -225,10 +235,10 @@ class MapEditor(QtWidgets.QDialog):
             y, x = self.group_mask[-1]
             new_pos = (y + yd, x + xd)
 
-            if (0 <= new_pos[0] < NUM_BUTTON_ROWS) and (0 <= new_pos[1] < NUM_BUTTON_COLUMNS):
+            if (0 <= new_pos[0] < self.rows) and (0 <= new_pos[1] < self.columns):
                 self.drawSelectionMask(new_pos)
                 button = self.buttonAtPosition(*new_pos)
-                self.scrollArea.ensureWidgetVisible(button)
+                self.ensureButtonVisible(button)
 
         else:
             self.clearSelectedPositions()
@@ -374,6 +384,10 @@ class MapEditor(QtWidgets.QDialog):
                     QtWidgets.qApp.quit()
 
     def setSaveEnabled(self, value):
+        # Save is enabled by every edit, so the playtest snapshot is stale
+        if value:
+            self.playtest_data = None
+
         if value == self.save_enabled:
             return
 
@@ -384,31 +398,63 @@ class MapEditor(QtWidgets.QDialog):
     def wheelEvent(self, event):
         num_clicks = event.angleDelta().y() / SCROLL_UNITS_PER_CLICK
 
+        # Zoom around the point under the cursor
+        self.zoom_anchor = self.tileGrid.mapFrom(self, event.pos())
+
         if num_clicks > 0:
-            self.increaseZoomLevel(False, num_clicks)
+            self.increaseZoomLevel(False, num_clicks, deferred=True)
         else:
-            self.decreaseZoomLevel(False, abs(num_clicks))
+            self.decreaseZoomLevel(False, abs(num_clicks), deferred=True)
 
     def resizeGridView(self, button_size, font_size):
         tile_button.TileButton.set_dimensions(button_size, button_size)
+        self.tileGrid.setCellSize(button_size, font_size)
 
-        for y in range(self.rows):
-            for x in range(self.columns):
-                btn = self.buttonAtPosition(y, x)
+    def zoomGridView(self, deferred=False):
+        if not deferred:
+            self.zoomTimer.stop()
+            self.zoom_anchor = None
+            self.resizeGridView(ZoomLevel.button_size, ZoomLevel.font_size)
+            return
+
+        # Preview the new zoom level by scaling the rendered grid, and re-lay
+        # out the grid only once no more zoom changes have been seen for a while
+        scale = float(ZoomLevel.button_size) / self.tileGrid.cell_size
+        self.tileGrid.setPreviewScale(scale, self.zoom_anchor)
+        self.zoomTimer.start(ZOOM_DEBOUNCE_MS)
 
-                self.font.setPointSize(font_size)
-                btn.setFont(self.font)
-                btn.setFixedSize(button_size, button_size)
+    def applyDeferredZoom(self):
+        anchor = self.zoom_anchor
+        self.zoom_anchor = None
 
-                if (y, x) in _tiles:
-                    btn.redrawDoors()
+        old_step = self.tileGrid.cell_size + self.tileGrid.spacing
+        hbar = self.scrollArea.horizontalScrollBar()
+        vbar = self.scrollArea.verticalScrollBar()
+
+        self.resizeGridView(ZoomLevel.button_size, ZoomLevel.font_size)
+
+        if anchor is None:
+            return
+
+        # Scroll so the point that was under the cursor stays under the cursor
+        new_step = self.tileGrid.cell_size + self.tileGrid.spacing
+        margin = self.tileGrid.margin
+        ratio = float(new_step) / old_step
+
+        viewport_x = anchor.x() - hbar.value()
+        viewport_y = anchor.y() - vbar.value()
+        new_x = margin + ((anchor.x() - margin) * ratio)
+        new_y = margin + ((anchor.y() - margin) * ratio)
+
+        hbar.setValue(int(new_x - viewport_x))
+        vbar.setValue(int(new_y - viewport_y))
 
     def setDefaultZoomLevel(self):
         ZoomLevel.button_size = DEFAULT_BUTTON_SIZE
         ZoomLevel.font_size = DEFAULT_FONT_SIZE
-        self.resizeGridView(ZoomLevel.button_size, ZoomLevel.font_size)
+        self.zoomGridView()
 
-    def increaseZoomLevel(self, _, num=1):
+    def increaseZoomLevel(self, _, num=1, deferred=False):
         moved = 0
         while ((num > 0) and (ZoomLevel.button_size < MAX_BUTTON_SIZE) and
                (ZoomLevel.font_size < MAX_FONT_SIZE)):
@@ -420,9 +466,9 @@ class MapEditor(QtWidgets.QDialog):
         if moved == 0:
             return
 
-        self.resizeGridView(ZoomLevel.button_size, ZoomLevel.font_size)
+        self.zoomGridView(deferred)
 
-    def decreaseZoomLevel(self, _, num=1):
+    def decreaseZoomLevel(self, _, num=1, deferred=False):
         moved = 0
         while((num > 0) and (ZoomLevel.button_size > MIN_BUTTON_SIZE) and
               (ZoomLevel.font_size > MIN_FONT_SIZE)):
@@ -434,14 +480,17 @@ class MapEditor(QtWidgets.QDialog):
         if moved == 0:
             return
 
-        self.resizeGridView(ZoomLevel.button_size, ZoomLevel.font_size)
+        self.zoomGridView(deferred)
 
     def clearAllTiles(self):
-        for pos in list(_tiles.keys()):
+        positions = list(self.model)
+        self.model.clear()
+        self.playtest_data = None
+
+        for pos in positions:
             button = self.buttonAtPosition(*pos)
             button.setText("")
             button.clearDoors()
-            del _tiles[pos]
             button.setStyle(selected=False, start=False)
 
         for pos in self.selectedPositions + [self.selectedPosition]:
@@ -451,36 +500,65 @@ class MapEditor(QtWidgets.QDialog):
             button = self.buttonAtPosition(*pos)
             button.setStyle()
 
-        self.startTilePosition = None
         self.selectedPosition = None
         self.selectedPositions = []
+        self.selectedPositionSet.clear()
 
         self.enableSelectionDependentItems()
 
-    def tile_id_in_map_data(self, tile_list, tile_id):
-        for tiledata in tile_list:
-            if tiledata["tile_id"] == tile_id:
-                return True
+    def serialize(self):
+        return self.model.serialize()
+
+    def playtestData(self):
+        """
+        Get map data to pass to a new game terminal. The data is kept until the
+        map is next edited, so the game can be started repeatedly without
+        serializing the whole map each time
+
+        :return: serialized map data, in JSON format
+        :rtype: str
+        """
+        if self.playtest_data is None:
+            self.playtest_data = json.dumps(self.serialize())
+
+        return self.playtest_data
+
+    def growGridToFit(self, positions):
+        # Grow the grid if needed, so that all tile positions fit
+        rows = max([self.rows] + [pos[0] + 1 for pos in positions.values()])
+        columns = max([self.columns] + [pos[1] + 1 for pos in positions.values()])
+        self.setGridSize(rows, columns)
+
+    def placeTiles(self, tiles, positions, start_tile_id):
+        """
+        Put tiles on the grid at their saved positions. Doors are not drawn,
+        since they depend on the links between tiles; see redrawAllDoors
+
+        :param list tiles: tiles to place
+        :param dict positions: grid positions of tiles, keyed by tile ID
+        :param start_tile_id: tile ID of the start tile
+        """
+        for pos in self.model.place_tiles(tiles, positions):
+            tileobj = self.model.tile_at(pos)
+            button = self.buttonAtPosition(*pos)
+            button.setText(tileobj.map_identifier)
 
-        return False
+            is_start = tileobj.tile_id == start_tile_id
+            button.setStyle(selected=False, start=is_start)
 
-    def serialize(self):
-        return tgmdata.serialize(_tiles[self.startTilePosition], _tiles)
+    def redrawAllDoors(self):
+        for pos in self.model:
+            self.buttonAtPosition(*pos).redrawDoors()
 
     def drawTileMap(self, start_tile, positions):
-        for tile_id in positions:
-            pos = tuple(positions[tile_id])
-            tileobj = tile.get_tile_by_id(tile_id)
-            if tileobj is None:
-                continue
+        self.growGridToFit(positions)
 
-            _tiles[pos] = tileobj
-            button = self.buttonAtPosition(*pos)
-            button.setText(tileobj.map_identifier)
+        tiles = [tile.get_tile_by_id(tile_id) for tile_id in positions]
+        start_tile_id = None if start_tile is None else start_tile.tile_id
 
-            is_start = tileobj is start_tile
-            button.setStyle(selected=False, start=is_start)
-            button.redrawDoors()
+        self.placeTiles([t for t in tiles if t is not None], positions,
+                        start_tile_id)
+        self.redrawAllDoors()
 
     def deserialize(self, attrs):
         start_tile = tgmdata.deserialize(attrs)
@@ -504,23 +582,20 @@ class MapEditor(QtWidgets.QDialog):
         start_tile_name = attrs[player.START_TILE_KEY]
         start_tile = tile.builder(tilelist, start_tile_name, obj_version)
 
-        # find lowest index tile in tilemap
-        positions = getTilePositions(start_tile)
-        lowest_y = positions[start_tile.tile_id][0]
-        lowest_x = positions[start_tile.tile_id][1]
+        positions, conflicts = get_tile_positions(start_tile)
 
-        for tile_id in positions:
-            pos = positions[tile_id]
-            if (pos[0] < lowest_y):
-                lowest_y = pos[0]
+        # Correct tile positions so lowest tile is (0, 0)
+        positions = normalize_positions(positions)
 
-            if (pos[1] < lowest_x):
-                lowest_x = pos[1]
+        if conflicts:
+            lines = [str(c) for c in conflicts[:MAX_REPORTED_CONFLICTS]]
+            if len(conflicts) > MAX_REPORTED_CONFLICTS:
+                lines.append("(%d more)" % (len(conflicts) - MAX_REPORTED_CONFLICTS))
 
-        # Correct tile positions so lowest tile is (0, 0)
-        for tile_id in positions:
-            old = positions[tile_id]
-            positions[tile_id] = (old[0] + abs(lowest_y), old[1] + abs(lowest_x))
+            errorDialog(self, "Conflicting tile positions", "%d tile(s) could "
+                        "not be placed on the grid, because their position is "
+                        "already occupied by another tile:\n\n%s"
+                        % (len(conflicts), "\n".join(lines)))
 
         self.clearAllTiles()
         self.drawTileMap(start_tile, positions)
@@ -528,12 +603,49 @@ class MapEditor(QtWidgets.QDialog):
 
         return True
 
+    def setGridSize(self, rows, columns):
+        if (rows == self.rows) and (columns == self.columns):
+            return
+
+        self.rows = rows
+        self.columns = columns
+        self.tileGrid.setGridSize(rows, columns)
+
+    def gridSizeButtonClicked(self):
+        # Grid must always be big enough to hold all existing tiles and
+        # selected positions
+        positions = list(self.model) + self.selectedPositions
+        if self.selectedPosition is not None:
+            positions.append(self.selectedPosition)
+
+        min_rows = max([1] + [pos[0] + 1 for pos in positions])
+        min_columns = max([1] + [pos[1] + 1 for pos in positions])
+
+        rows, accepted = QtWidgets.QInputDialog.getInt(self, "Grid size",
+                                                       "Number of rows",
+                                                       self.rows, min_rows,
+                                                       MAX_GRID_SIZE)
+        if not accepted:
+            return
+
+        columns, accepted = QtWidgets.QInputDialog.getInt(self, "Grid size",
+                                                          "Number of columns",
+                                                          self.columns, min_columns,
+                                                          MAX_GRID_SIZE)
+        if not accepted:
+            return
+
+        self.setGridSize(rows, columns)
+
     def buttonAtPosition(self, y, x):
-        item = self.gridLayout.itemAtPosition(y, x)
-        if item is None:
-            return None
+        return self.tileGrid.buttonAtPosition(y, x)
 
-        return item.widget()
+    def ensureButtonVisible(self, button, margin=50):
+        rect = self.tileGrid.cellRect(*button.position)
+        center = rect.center()
+        self.scrollArea.ensureVisible(center.x(), center.y(),
+                                      (rect.width() // 2) + margin,
+                                      (rect.height() // 2) + margin)
 
     def closestTileToOrigin(self, tilemap):
         seen = []
@@ -574,7 +686,7 @@ class MapEditor(QtWidgets.QDialog):
         if self.selectedPosition == self.startTilePosition:
             return
 
-        if self.selectedPosition not in _tiles:
+        if self.selectedPosition not in self.model:
             return
 
         if self.startTilePosition is not None:
@@ -599,7 +711,7 @@ class MapEditor(QtWidgets.QDialog):
         return val is not None
 
     def runGameButtonClicked(self):
-        if len(_tiles) == 0:
+        if len(self.model) == 0:
             errorDialog(self, "Unable to run game", "No tiles created yet. You "
                         "must create some tiles before running the game.")
             return
@@ -609,7 +721,7 @@ class MapEditor(QtWidgets.QDialog):
                         "must set a start tile before running the game.")
             return
 
-        gamewin = GameTerminal(self, json.dumps(self.serialize()))
+        gamewin = GameTerminal(self, self.playtestData())
         gamewin.setWindowModality(QtCore.Qt.ApplicationModal)
         gamewin.exec_()
 
@@ -641,7 +753,7 @@ class MapEditor(QtWidgets.QDialog):
 
         self.deserializeFromSaveFile(attrs)
 
-        if _tiles:
+        if self.model:
             self.clearButton.setEnabled(True)
 
     def deleteButtonClicked(self):
@@ -652,7 +764,7 @@ class MapEditor(QtWidgets.QDialog):
             return
 
         if len(tiles) == 1:
-            tileobj = _tiles[self.selectedPosition]
+            tileobj = self.model.tile_at(self.selectedPosition)
             msg = ("Are you sure you want to delete this tile (tile ID is '%s')"
                    % tileobj.tile_id)
         else:
@@ -669,21 +781,17 @@ class MapEditor(QtWidgets.QDialog):
 
     def deleteTile(self, pos):
         button = self.buttonAtPosition(*pos)
-        tileobj = self.tileAtPosition(*pos)
-
-        tile.unregister_tile_id(tileobj.tile_id)
-        self.disconnectSurroundingTiles(tileobj, *pos)
-        del _tiles[pos]
-        button.setText("")
 
-        if self.startTilePosition == pos:
-            self.startTilePosition = None
+        for adjacent_pos in self.model.remove(pos):
+            # re-draw the tile we just disconnected from
+            self.buttonAtPosition(*adjacent_pos).update()
 
+        button.setText("")
         button.setStyle(selected=False, start=False)
         button.redrawDoors()
 
         # Did we delete the last tile?
-        if _tiles:
+        if self.model:
             # If not, enable saving to file (if it was disabled)
             self.setSaveEnabled(True)
         else:
@@ -691,8 +799,8 @@ class MapEditor(QtWidgets.QDialog):
             self.clearButton.setEnabled(False)
 
     def getSelectedPositions(self):
-        positions = [p for p in self.selectedPositions if p in _tiles]
-        if self.selectedPosition in _tiles and self.selectedPosition not in positions:
+        positions = [p for p in self.selectedPositions if p in self.model]
+        if self.selectedPosition in self.model and self.selectedPosition not in positions:
             positions.append(self.selectedPosition)
 
         return positions
@@ -706,7 +814,7 @@ class MapEditor(QtWidgets.QDialog):
             if not b:
                 continue
 
-            is_selected = (pos == self.selectedPosition) or (pos in self.selectedPositions)
+            is_selected = (pos == self.selectedPosition) or (pos in self.selectedPositionSet)
             is_start = pos == self.startTilePosition
             b.setStyle(selected=is_selected, start=is_start)
 
@@ -757,9 +865,8 @@ class MapEditor(QtWidgets.QDialog):
         self.group_mask = self.getSelectedPositions()
 
         # If cursor is currently over a tile, initialize selection mask there
-        if tile_button.TileButton.hovering:
-            pos = self.getButtonPosition(tile_button.TileButton.hovering)
-            self.drawSelectionMask(pos)
+        if self.tileGrid.hover_position is not None:
+            self.drawSelectionMask(self.tileGrid.hover_position)
 
     def copyButtonClicked(self):
         # Are we already in the middle of a copy/move operation?
@@ -774,21 +881,22 @@ class MapEditor(QtWidgets.QDialog):
         self.group_mask = self.getSelectedPositions()
 
         # If cursor is currently over a tile, initialize selection mask there
-        if tile_button.TileButton.hovering:
-            pos = self.getButtonPosition(tile_button.TileButton.hovering)
-            self.drawSelectionMask(pos)
+        if self.tileGrid.hover_position is not None:
+            self.drawSelectionMask(self.tileGrid.hover_position)
 
     def doorButtonClicked(self):
-        tileobj = _tiles[self.selectedPosition]
+        tileobj = self.model.tile_at(self.selectedPosition)
         button = self.buttonAtPosition(*self.selectedPosition)
 
+        self.model.mark_dirty([self.selectedPosition])
         doors_dialog = DoorEditor(self, tileobj)
         doors_dialog.setWindowModality(QtCore.Qt.ApplicationModal)
         doors_dialog.exec_()
         self.setSaveEnabled(True)
 
     def itemButtonClicked(self):
-        tileobj = _tiles[self.selectedPosition]
+        tileobj = self.model.tile_at(self.selectedPosition)
+        self.model.mark_dirty([self.selectedPosition])
         items_dialog = TileItemBrowser(self, tileobj)
         items_dialog.setWindowModality(QtCore.Qt.ApplicationModal)
         items_dialog.exec_()
@@ -801,7 +909,7 @@ class MapEditor(QtWidgets.QDialog):
         self.setSaveEnabled(True)
 
     def wallButtonClicked(self):
-        tileobj = _tiles[self.selectedPosition]
+        tileobj = self.model.tile_at(self.selectedPosition)
         button = self.buttonAtPosition(*self.selectedPosition)
 
         settings = forms.WallSettings()
@@ -826,6 +934,7 @@ class MapEditor(QtWidgets.QDialog):
             return None
 
         # Apply form settings to selected tile
+        self.model.mark_dirty([self.selectedPosition])
         for direction in ['north', 'south', 'east', 'west']:
             adj = getattr(tileobj, direction)
             had_wall = True if (adj is None) or adj.is_door() else False
@@ -867,8 +976,20 @@ class MapEditor(QtWidgets.QDialog):
         dialog.setFileMode(QtWidgets.QFileDialog.AnyFile)
         dialog.setAcceptMode(QtWidgets.QFileDialog.AcceptSave)
         dialog.setDefaultSuffix(MAP_BUILDER_SAVE_FILE_SUFFIX)
-        dialog.setNameFilter("Text Game Map Data Files (*.%s)"
-                             % MAP_BUILDER_SAVE_FILE_SUFFIX)
+
+        json_filter = ("Text Game Map Data Files (*.%s)"
+                       % MAP_BUILDER_SAVE_FILE_SUFFIX)
+        binary_filter = ("Binary Text Game Map Data Files (*.%s)"
+                         % tgmdata.BINARY_FILE_SUFFIX)
+
+        def _filter_selected(name_filter):
+            if name_filter == binary_filter:
+                dialog.setDefaultSuffix(tgmdata.BINARY_FILE_SUFFIX)
+            else:
+                dialog.setDefaultSuffix(MAP_BUILDER_SAVE_FILE_SUFFIX)
+
+        dialog.setNameFilters([json_filter, binary_filter])
+        dialog.filterSelected.connect(_filter_selected)
 
         if dialog.exec_():
             filenames = dialog.selectedFiles()
@@ -899,43 +1020,146 @@ class MapEditor(QtWidgets.QDialog):
         self.saveToFile(filename)
 
     def saveToFile(self, filename):
+        # Tile data is snapshotted here on the GUI thread, so that the map can
+        # be edited while the snapshot is being written
         try:
-            string_data = json.dumps(self.serialize())
-            compressed = zlib.compress(bytes(string_data, encoding="utf8"))
-
-            with open(filename, 'wb') as fh:
-                fh.write(compressed)
+            attrs = self.serialize()
         except Exception:
             errorDialog(self, "Error saving map data",
                         "Unable to save map data to file %s:\n\n%s"
                         % (filename, traceback.format_exc()))
+            return
 
         self.setSaveEnabled(False)
 
+        if self.save_thread is not None:
+            self.pending_save = (attrs, filename)
+            return
+
+        self.startSaveThread(attrs, filename)
+
+    def startSaveThread(self, attrs, filename):
+        self.save_thread = threading.Thread(target=self.runSave,
+                                            args=(attrs, filename))
+        self.save_thread.daemon = False
+        self.save_thread.start()
+
+    def runSave(self, attrs, filename):
+        error = None
+
+        try:
+            tgmdata.write_file(attrs, filename)
+        except Exception:
+            error = traceback.format_exc()
+
+        self.saveFinishedSignal.signal.emit(filename, error)
+
+    def waitForSave(self):
+        """
+        Block until any running or pending save has been written
+        """
+        while self.save_thread is not None:
+            self.save_thread.join()
+            QtWidgets.QApplication.processEvents()
+
+    def onSaveFinished(self, filename, error):
+        self.save_thread.join()
+        self.save_thread = None
+
+        if self.pending_save is not None:
+            attrs, pending_filename = self.pending_save
+            self.pending_save = None
+            self.startSaveThread(attrs, pending_filename)
+
+        if error is not None:
+            # Map data was not saved, allow saving again
+            self.setSaveEnabled(True)
+            errorDialog(self, "Error saving map data",
+                        "Unable to save map data to file %s:\n\n%s"
+                        % (filename, error))
+
     def loadFromFile(self, filename):
+        # File may be one that is still being written
+        self.waitForSave()
+
         if not os.path.exists(filename):
             errorDialog(self, "Can't find file", "There doesn't seem to be a "
                         "file called '%s'" % filename)
             return
 
+        # Current map is put back if loading fails or is cancelled
+        old_registry = dict(tile._tiles)
+        old_positions = self.model.tile_positions()
+        old_start_position = self.startTilePosition
+        old_start_tile = self.model.start_tile()
+        old_saved_objects = saved_objects.get_objects()
+
+        progress = QtWidgets.QProgressDialog("Loading %s" % os.path.basename(filename),
+                                             "Cancel", 0, os.path.getsize(filename),
+                                             self)
+        progress.setWindowTitle("Loading map data")
+        progress.setWindowModality(QtCore.Qt.WindowModal)
+        progress.setMinimumDuration(LOAD_PROGRESS_DELAY_MS)
+        self.loadProgress.connect(progress.setValue)
+
         try:
             with open(filename, 'rb') as fh:
-                strdata = fh.read()
-
-            decompressed = zlib.decompress(strdata).decode("utf-8")
-            attrs = json.loads(decompressed)
-            self.deserialize(attrs)
+                loaded = self.loadTilesFromStream(fh, progress)
         except Exception:
+            loaded = False
             errorDialog(self, "Error loading saved map data",
                         "Unable to load saved map data from file %s:\n\n%s"
                         % (filename, traceback.format_exc()))
+        finally:
+            self.loadProgress.disconnect(progress.setValue)
+            progress.close()
+
+        if not loaded:
+            self.clearAllTiles()
+            tile._tiles.clear()
+            tile._tiles.update(old_registry)
+            saved_objects.set_objects(old_saved_objects)
+            self.drawTileMap(old_start_tile, old_positions)
+            self.startTilePosition = old_start_position
+            return
 
         self.loaded_file = filename
-        if _tiles:
+        if self.model:
             self.clearButton.setEnabled(True)
 
         self.setSaveEnabled(False)
 
+    def loadTilesFromStream(self, fh, progress):
+        """
+        Replace the current map with map data read from a compressed save file.
+        Tiles are drawn on the grid in batches as they are read
+
+        :param fh: file object to read compressed map data from
+        :param QtWidgets.QProgressDialog progress: dialog to check for\
+            cancellation
+        :return: False if loading was cancelled, True otherwise
+        :rtype: bool
+        """
+        loader = tgmdata.MapLoader(fh)
+        self.clearAllTiles()
+        grown = False
+
+        for batch in loader.batches():
+            if not grown:
+                self.growGridToFit(loader.positions)
+                grown = True
+
+            self.placeTiles(batch, loader.positions, loader.start_tile_id)
+            self.loadProgress.emit(loader.bytes_read)
+            QtWidgets.QApplication.processEvents()
+
+            if progress.wasCanceled():
+                return False
+
+        self.redrawAllDoors()
+        self.startTilePosition = tuple(loader.positions[loader.start_tile.tile_id])
+        return True
+
     def loadButtonClicked(self):
         filedialog = QtWidgets.QFileDialog
         options = filedialog.Options()
@@ -950,45 +1174,19 @@ class MapEditor(QtWidgets.QDialog):
         self.loadFromFile(filename)
 
     def getButtonPosition(self, button):
-        idx = self.gridLayout.indexOf(button)
-        return self.gridLayout.getItemPosition(idx)[:2]
+        # Constant-time; buttons know their own position on the grid
+        return button.position
 
     def tileAtPosition(self, y, x):
-        pos = (y, x)
-        if pos not in _tiles:
-            return None
-
-        return _tiles[pos]
-
-    def surroundingTilePositions(self, y, x):
-        def _fetch_tile(y, x, yoff, xoff):
-            oldy, oldx = y, x
-            newy = oldy + yoff
-            newx = oldx + xoff
-
-            if newy < 0: return None
-            if newx < 0: return None
-
-            newpos = (newy, newx)
-            if newpos not in _tiles:
-                return None
-
-            return newpos
-
-        north = _fetch_tile(y, x, -1, 0)
-        south = _fetch_tile(y, x, 1, 0)
-        east = _fetch_tile(y, x, 0, 1)
-        west = _fetch_tile(y, x, 0, -1)
-
-        return north, south, east, west
+        return self.model.tile_at((y, x))
 
     def enableSelectionDependentItems(self):
-        exactly_one = self.selectedPosition in _tiles
+        exactly_one = self.selectedPosition in self.model
         one_or_more = exactly_one
 
         if not exactly_one:
             for pos in self.selectedPositions:
-                if pos in _tiles:
+                if pos in self.model:
                     one_or_more = True
                     break
 
@@ -1017,10 +1215,9 @@ class MapEditor(QtWidgets.QDialog):
 
         self.selectedPosition = self.getButtonPosition(button)
         newstart = self.selectedPosition == self.startTilePosition
-        newfilled = self.selectedPosition in _tiles
         button.setStyle(selected=True, start=newstart)
 
-        filled = self.selectedPosition in _tiles
+        filled = self.selectedPosition in self.model
 
         if self.selectedPosition == self.startTilePosition:
             _silent_checkbox_set(self.startTileCheckBox, True, self.setStartTile)
@@ -1035,36 +1232,40 @@ class MapEditor(QtWidgets.QDialog):
             self.startTileCheckBox.setEnabled(False)
             self.main.startTileAction.setEnabled(False)
 
-        button.setFocus(True)
+        self.tileGrid.setFocus()
         self.last_selection_added = self.selectedPosition
-        self.scrollArea.ensureWidgetVisible(button)
+        self.ensureButtonVisible(button)
         self.enableSelectionDependentItems()
 
     def addSelectedPosition(self, button):
         if self.selectedPosition is not None:
             self.selectedPositions.append(self.selectedPosition)
+            self.selectedPositionSet.add(self.selectedPosition)
             self.selectedPosition = None
 
         pos = self.getButtonPosition(button)
         self.last_selection_added = pos
-        if pos in self.selectedPositions:
+        if pos in self.selectedPositionSet:
             return
 
         self.selectedPositions.append(pos)
+        self.selectedPositionSet.add(pos)
         is_start = pos == self.startTilePosition
         button.setStyle(selected=True, start=is_start)
         self.enableSelectionDependentItems()
 
         # Start tile checkbox should always be disabled with multiple tiles selected
-        _silent_checkbox_set(self.startTileCheckBox, False, self.setStartTile)
+        if self.startTileCheckBox.isChecked():
+            _silent_checkbox_set(self.startTileCheckBox, False, self.setStartTile)
+
         self.startTileCheckBox.setEnabled(False)
         self.main.startTileAction.setEnabled(False)
 
     def runTileBuilderDialog(self, position):
         settings = forms.TileSettings()
 
-        if position in _tiles:
-            tileobj = _tiles[position]
+        if position in self.model:
+            tileobj = self.model.tile_at(position)
             settings.description = tileobj.description
             settings.name = tileobj.name
             settings.tile_id = tileobj.tile_id
@@ -1105,6 +1306,9 @@ class MapEditor(QtWidgets.QDialog):
             else:
                 complete = True
 
+        # Tile is about to change; neighbours store its ID, so they change too
+        self.model.mark_dirty([position])
+
         if settings.tile_id != tileobj.tile_id:
             tileobj.set_tile_id(settings.tile_id)
 
@@ -1124,67 +1328,8 @@ class MapEditor(QtWidgets.QDialog):
         return tileobj
 
     def redrawSurroundingTiles(self, y, x):
-        north, south, east, west = self.surroundingTilePositions(y, x)
-        adjacent_tiles = {'north': north, 'south': south, 'east': east, 'west': west}
-
-        for direction in adjacent_tiles:
-            adjacent_tilepos = adjacent_tiles[direction]
-
-            if not adjacent_tilepos:
-                continue
-
-            button = self.buttonAtPosition(*adjacent_tilepos)
-            button.update()
-
-    def disconnectSurroundingTiles(self, tileobj, y, x):
-        north, south, east, west = self.surroundingTilePositions(y, x)
-        adjacent_tiles = {'north': north, 'south': south, 'east': east, 'west': west}
-
-        for direction in adjacent_tiles:
-            adjacent_tilepos = adjacent_tiles[direction]
-
-            if not adjacent_tilepos:
-                continue
-
-            adjacent_tileobj = self.tileAtPosition(*adjacent_tilepos)
-            setattr(tileobj, direction, None)
-
-            # re-draw the tile we just disconnected from
-            button = self.buttonAtPosition(*adjacent_tilepos)
-            button.update()
-
-            reverse_direction = tile.reverse_direction(direction)
-            reverse_pointer = getattr(adjacent_tileobj, reverse_direction)
-
-            if reverse_pointer and reverse_pointer.is_door():
-                reverse_pointer.replacement_tile = None
-            else:
-                setattr(adjacent_tileobj, tile.reverse_direction(direction), None)
-
-    def connectSurroundingTiles(self, tileobj, y, x):
-        north, south, east, west = self.surroundingTilePositions(y, x)
-        adjacent_tiles = {'north': north, 'south': south, 'east': east, 'west': west}
-
-        for direction in adjacent_tiles:
-            adjacent_tilepos = adjacent_tiles[direction]
-
-            if not adjacent_tilepos:
-                continue
-
-            adjacent_tileobj = self.tileAtPosition(*adjacent_tilepos)
-            setattr(tileobj, direction, adjacent_tileobj)
-
-            # re-draw the tile we just connected to
-            button = self.buttonAtPosition(*adjacent_tilepos)
-            button.update()
-
-            reverse_direction = tile.reverse_direction(direction)
-            reverse_pointer = getattr(adjacent_tileobj, reverse_direction)
-
-            if reverse_pointer and reverse_pointer.is_door():
-                reverse_pointer.replacement_tile = tileobj
-            else:
-                setattr(adjacent_tileobj, tile.reverse_direction(direction), tileobj)
+        for adjacent_pos in self.model.neighbours((y, x)).values():
+            self.buttonAtPosition(*adjacent_pos).update()
 
     def editSelectedTile(self):
         if self.selectedPosition is None:
@@ -1195,136 +1340,53 @@ class MapEditor(QtWidgets.QDialog):
     def moveSelectionMask(self):
         # Get positions of all the original tiles from the selection mask
         orig_positions = self.getSelectedPositions()
+        new_positions = self.group_mask
+        old_start_position = self.startTilePosition
 
-        src_tiles = {}
-
-        # Populate & connect all the new tiles
-        for i in range(len(orig_positions)):
-            pos = orig_positions[i]
-            src_tile = self.tileAtPosition(*pos)
-            directions = ['north', 'south', 'east', 'west']
-
-            # Handle new tile connections
-            for attr in directions:
-                delta_y, delta_x = _move_map[attr]
-                adj_pos = (pos[0] + delta_y, pos[1] + delta_x)
-
-                # If this tile is connected to a tile we're not moving, we'll
-                # need to sever that connection
-                if adj_pos not in orig_positions:
-                    adj_tile = self.tileAtPosition(*adj_pos)
-                    if adj_tile:
-                        setattr(src_tile, attr, None)
-                        setattr(adj_tile, tile.reverse_direction(attr), None)
-                        adj_button = self.buttonAtPosition(*adj_pos)
-                        is_start = adj_pos == self.selectedPosition
-                        adj_button.setStyle(start=is_start)
-
-                    continue
-
-            # Save src tile for the next iteration so we can delete it now
-            src_tiles[pos] = _tiles[pos]
+        severed = self.model.move_region(orig_positions, new_positions)
 
-            # Delete tile from old position
-            del _tiles[pos]
+        # Re-draw tiles that were disconnected from the moved tiles
+        for pos in severed:
+            is_start = pos == self.startTilePosition
+            button = self.buttonAtPosition(*pos)
+            button.setStyle(start=is_start)
+            button.update()
 
+        # Clear the old tile positions first, and draw the new tile
+        # positions after, in case the two groups overlap
+        for pos in orig_positions:
             old_button = self.buttonAtPosition(*pos)
             old_button.setText("")
             old_button.setStyle()
             old_button.redrawDoors()
 
-        # Loop over buttons again to draw new tiles; we need two seperate
-        # loops for drawing the old tile positions and drawing the new
-        # tile positions after moving, in case the two groups overlap
-        for i in range(len(orig_positions)):
-            pos = orig_positions[i]
-            src_tile = src_tiles[pos]
-
-            # Add tile to new position
-            _tiles[self.group_mask[i]] = src_tile
-
-            button = self.buttonAtPosition(*self.group_mask[i])
-            button.setText(src_tile.map_identifier)
+        for old_pos, pos in zip(orig_positions, new_positions):
+            tileobj = self.model.tile_at(pos)
+            button = self.buttonAtPosition(*pos)
+            button.setText(tileobj.map_identifier)
 
-            # Handle the case where start tile was moved - need to change
-            # start tile position
-            if self.startTilePosition == pos:
-                self.startTilePosition = self.group_mask[i]
+            # Start tile stays selected if it was moved
+            if old_start_position == old_pos:
                 button.setStyle(selected=True, start=True)
             else:
                 button.setStyle()
 
             button.redrawDoors()
-
-    def getCopiedTileId(self, tile_id):
-        base = tile_id + "_copy"
-        if tile.get_tile_by_id(base) is None:
-            return base
-
-        num = 1
-        while True:
-            numbered_copy = base + str(num)
-            if tile.get_tile_by_id(numbered_copy) is None:
-                return numbered_copy
-
-            num += 1
+            button.update()
 
     def copySelectionMask(self):
         # Get positions of all the original tiles from the selection mask
         orig_positions = self.getSelectedPositions()
+        new_positions = self.group_mask
+
+        new_tiles = self.model.copy_region(orig_positions, new_positions)
 
-        # Map of source tile IDs to copied tile IDs
-        tile_id_map = {}
-
-        # Create all the new tiles
-        new_tiles = []
-        for i in range(len(orig_positions)):
-            src_tile = self.tileAtPosition(*orig_positions[i])
-            tileobj = src_tile.copy()
-            tileobj.set_tile_id(self.getCopiedTileId(src_tile.tile_id))
-            tile_id_map[src_tile.tile_id] = tileobj.tile_id
-            new_tiles.append(tileobj)
-
-        # Populate & connect all the new tiles
-        for i in range(len(orig_positions)):
-            src_tile = self.tileAtPosition(*orig_positions[i])
-            dest_tile = new_tiles[i]
-            directions = ['north', 'south', 'east', 'west']
-
-            # Handle new tile connections
-            for attr in directions:
-                src_adj = getattr(src_tile, attr)
-                if src_adj is None:
-                    dest_adj = None
-
-                elif src_adj.is_door():
-                    door_copy = copy.deepcopy(src_adj)
-                    door_copy.tile_id = None
-                    door_copy.set_tile_id(self.getCopiedTileId(src_adj.tile_id))
-                    door_copy.src_tile = dest_tile
-                    door_copy.replacement_tile = None
-                    dest_adj = door_copy
-
-                elif src_adj.tile_id in tile_id_map:
-                    copy_name = tile_id_map[src_adj.tile_id]
-                    dest_adj = tile.get_tile_by_id(copy_name)
-                    if dest_adj is None:
-                        setattr(dest_tile, attr, None)
-                        continue
-
-                    reverse_ptr = getattr(dest_adj, tile.reverse_direction(attr))
-                    if reverse_ptr and reverse_ptr.is_door():
-                        reverse_ptr.replacement_tile = dest_tile
-                else:
-                    dest_adj = None
-
-                setattr(dest_tile, attr, dest_adj)
-
-            _tiles[self.group_mask[i]] = dest_tile
-            button = self.buttonAtPosition(*self.group_mask[i])
+        for pos, dest_tile in zip(new_positions, new_tiles):
+            button = self.buttonAtPosition(*pos)
             button.setText(dest_tile.map_identifier)
             button.setStyle()
             button.redrawDoors()
+            button.update()
 
     def setSelectionMask(self):
         if self.copying:
@@ -1355,7 +1417,7 @@ class MapEditor(QtWidgets.QDialog):
             self.setSelectionMask()
             return
 
-        is_first_tile = (not _tiles)
+        is_first_tile = (not self.model)
         position = self.getButtonPosition(button)
         tileobj = self.runTileBuilderDialog(position)
 
@@ -1364,11 +1426,12 @@ class MapEditor(QtWidgets.QDialog):
             self.setSelectedPosition(button)
             return
 
-        if position not in _tiles:
+        if position not in self.model:
             # Created a new tile
-            _tiles[position] = tileobj
             button.setStyle(selected=True, start=False)
-            self.connectSurroundingTiles(tileobj, *position)
+            for adjacent_pos in self.model.place(position, tileobj):
+                # re-draw the tile we just connected to
+                self.buttonAtPosition(*adjacent_pos).update()
 
         button.setText(tileobj.map_identifier)
         self.setSelectedPosition(button)
@@ -0,0 +1,461 @@
+import copy
+
+from text_game_maker.tile import tile
+
+from text_game_map_maker import tgmdata
+from text_game_map_maker.tile_positions import MOVE_MAP
+
+
+DIRECTIONS = ['north', 'south', 'east', 'west']
+
+# Format of tile IDs given to copied tiles. {tile_id} is replaced with the ID of
+# the tile being copied, and {num} with a number that makes the ID unique. The
+# number is left out of the first copy of each tile
+COPIED_TILE_ID_FORMAT = "{tile_id}_copy{num}"
+
+
+def _copy_without_links(tileobj, linked_tiles):
+    """
+    Deep-copy a tile, without copying any of the given tiles that it links to.
+    Links to those tiles are set to None in the copy. Deep-copying a tile
+    along with its links would copy every tile reachable from it
+
+    :param text_game_maker.tile.tile.Tile tileobj: tile to copy
+    :param list linked_tiles: tiles linked to by tileobj
+    :return: copied tile
+    :rtype: text_game_maker.tile.tile.Tile
+    """
+    memo = {id(t): None for t in linked_tiles if isinstance(t, tile.Tile)}
+    return copy.deepcopy(tileobj, memo)
+
+def copy_tile(tileobj):
+    """
+    Copy a tile and its items. Same as Tile.copy, except the copy has no links
+    to other tiles
+
+    :param text_game_maker.tile.tile.Tile tileobj: tile to copy
+    :return: copied tile
+    :rtype: text_game_maker.tile.tile.Tile
+    """
+    new = _copy_without_links(tileobj, [getattr(tileobj, d) for d in DIRECTIONS])
+    new.items = {}
+
+    for loc in tileobj.items:
+        for item in tileobj.items[loc]:
+            new.add_item(item.copy())
+
+    return new
+
+def copy_door(door):
+    """
+    Copy a door. The copy has no links to other tiles, and does not lead
+    anywhere
+
+    :param text_game_maker.tile.tile.LockedDoor door: door to copy
+    :return: copied door
+    :rtype: text_game_maker.tile.tile.LockedDoor
+    """
+    linked_tiles = [getattr(door, d) for d in DIRECTIONS]
+    linked_tiles.extend([door.source_tile, door.replacement_tile])
+    return _copy_without_links(door, linked_tiles)
+
+
+class TileIdAllocator(object):
+    """
+    Generates unique tile IDs for copies of tiles. The next number to try is
+    remembered for each tile ID, so copying the same tiles many times does not
+    re-check every ID given to earlier copies. IDs of copies that have since
+    been deleted are not re-used, until reset is called
+    """
+    def __init__(self, id_format=COPIED_TILE_ID_FORMAT):
+        self.id_format = id_format
+        self.next_num = {}
+
+    def set_format(self, id_format):
+        self.id_format = id_format
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the next number to try for all tile IDs, so that the first free
+        ID is used for the next copy of each tile
+        """
+        self.next_num.clear()
+
+    def format(self, tile_id, num):
+        return self.id_format.format(tile_id=tile_id, num=num if num else "")
+
+    def allocate(self, tile_id, reserved=()):
+        """
+        Get a new tile ID for a copy of a tile
+
+        :param tile_id: ID of the tile being copied
+        :param reserved: tile IDs that are not registered yet, but must not be\
+            used
+        :return: tile ID that is not in use
+        :rtype: str
+        """
+        num = self.next_num.get(tile_id, 0)
+
+        while True:
+            new_id = self.format(tile_id, num)
+            num += 1
+
+            if (new_id not in reserved) and (tile.get_tile_by_id(new_id) is None):
+                break
+
+        self.next_num[tile_id] = num
+        return new_id
+
+    def reserve(self, tile_ids):
+        """
+        Get new tile IDs for copies of many tiles at once
+
+        :param list tile_ids: IDs of the tiles being copied
+        :return: dict mapping each ID in tile_ids to a new tile ID. New IDs are\
+            not in use, and are all different from each other
+        :rtype: dict
+        """
+        reserved = set()
+        ret = {}
+
+        for tile_id in tile_ids:
+            new_id = self.allocate(tile_id, reserved)
+            reserved.add(new_id)
+            ret[tile_id] = new_id
+
+        return ret
+
+
+class MapModel(object):
+    """
+    Holds the tiles of a map being edited, keyed by their (y, x) grid
+    position, and keeps the links between tiles in adjacent positions in sync
+    with the grid. Nothing here depends on Qt; the map editor is a view over a
+    MapModel, and tells the model which positions have changed so it can
+    redraw them
+    """
+    def __init__(self, copied_tile_id_format=COPIED_TILE_ID_FORMAT):
+        # Maps (y, x) positions to Tile instances
+        self.tiles = {}
+
+        # Generates tile IDs for copied tiles
+        self.tile_ids = TileIdAllocator(copied_tile_id_format)
+
+        # (y, x) position of the start tile, or None if no start tile is set
+        self.start_position = None
+
+        # Serialized tiles and doors, keyed by tile object. Entries are dropped
+        # by mark_dirty when a tile changes, and re-created on the next save
+        self.attrs_cache = {}
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def __contains__(self, pos):
+        return pos in self.tiles
+
+    def __iter__(self):
+        return iter(self.tiles)
+
+    def tile_at(self, pos):
+        """
+        Get the tile at a grid position
+
+        :param tuple pos: (y, x) grid position
+        :return: tile at the given position, or None if there is no tile there
+        :rtype: text_game_maker.tile.tile.Tile
+        """
+        return self.tiles.get(pos, None)
+
+    def start_tile(self):
+        return self.tile_at(self.start_position)
+
+    def tile_positions(self):
+        """
+        :return: grid positions of all tiles, keyed by tile ID
+        :rtype: dict
+        """
+        return {t.tile_id: pos for pos, t in self.tiles.items()}
+
+    def size(self):
+        """
+        :return: tuple of the form (rows, columns), giving the smallest grid\
+            that all tiles fit on
+        :rtype: tuple
+        """
+        rows = max([0] + [pos[0] + 1 for pos in self.tiles])
+        columns = max([0] + [pos[1] + 1 for pos in self.tiles])
+        return rows, columns
+
+    def neighbours(self, pos):
+        """
+        Get the positions of all tiles adjacent to a grid position
+
+        :param tuple pos: (y, x) grid position
+        :return: dict mapping directions to the positions of adjacent tiles.\
+            Directions with no adjacent tile are not included
+        :rtype: dict
+        """
+        ret = {}
+        y, x = pos
+
+        for direction in DIRECTIONS:
+            delta_y, delta_x = MOVE_MAP[direction]
+            newpos = (y + delta_y, x + delta_x)
+
+            if (newpos[0] < 0) or (newpos[1] < 0):
+                continue
+
+            if newpos in self.tiles:
+                ret[direction] = newpos
+
+        return ret
+
+    def mark_dirty(self, positions):
+        """
+        Drop cached serialized data for the tiles at the given grid positions,
+        for all tiles and doors they link to, and for all tiles adjacent to
+        them. Must be called before changing any of these tiles, or the links
+        between them. Changes made through MapModel methods do this already
+
+        :param positions: (y, x) grid positions of tiles about to be changed
+        """
+        for pos in positions:
+            dirty_positions = [pos]
+            dirty_positions.extend(self.neighbours(pos).values())
+
+            for dirty_pos in dirty_positions:
+                tileobj = self.tiles.get(dirty_pos, None)
+                if tileobj is None:
+                    continue
+
+                self.attrs_cache.pop(tileobj, None)
+                for adjacent_tileobj in tileobj.iterate_directions():
+                    self.attrs_cache.pop(adjacent_tileobj, None)
+
+    def connect(self, pos):
+        """
+        Link the tile at a grid position to all adjacent tiles. Doors on
+        adjacent tiles that lead to this position are re-pointed at this tile
+
+        :param tuple pos: (y, x) grid position
+        :return: positions of the adjacent tiles
+        :rtype: list
+        """
+        self.mark_dirty([pos])
+        tileobj = self.tiles[pos]
+        neighbours = self.neighbours(pos)
+
+        for direction in neighbours:
+            adjacent_tileobj = self.tiles[neighbours[direction]]
+            setattr(tileobj, direction, adjacent_tileobj)
+
+            reverse_direction = tile.reverse_direction(direction)
+            reverse_pointer = getattr(adjacent_tileobj, reverse_direction)
+
+            if reverse_pointer and reverse_pointer.is_door():
+                reverse_pointer.replacement_tile = tileobj
+            else:
+                setattr(adjacent_tileobj, reverse_direction, tileobj)
+
+        return list(neighbours.values())
+
+    def disconnect(self, pos):
+        """
+        Remove the links between the tile at a grid position and all adjacent
+        tiles. Doors on adjacent tiles that lead to this position are kept, but
+        no longer lead anywhere
+
+        :param tuple pos: (y, x) grid position
+        :return: positions of the adjacent tiles
+        :rtype: list
+        """
+        self.mark_dirty([pos])
+        tileobj = self.tiles[pos]
+        neighbours = self.neighbours(pos)
+
+        for direction in neighbours:
+            adjacent_tileobj = self.tiles[neighbours[direction]]
+            setattr(tileobj, direction, None)
+
+            reverse_direction = tile.reverse_direction(direction)
+            reverse_pointer = getattr(adjacent_tileobj, reverse_direction)
+
+            if reverse_pointer and reverse_pointer.is_door():
+                reverse_pointer.replacement_tile = None
+            else:
+                setattr(adjacent_tileobj, reverse_direction, None)
+
+        return list(neighbours.values())
+
+    def place(self, pos, tileobj, connect=True):
+        """
+        Put a tile at an empty grid position
+
+        :param tuple pos: (y, x) grid position
+        :param text_game_maker.tile.tile.Tile tileobj: tile to place
+        :param bool connect: if True, link the tile to all adjacent tiles
+        :return: positions of the adjacent tiles that were linked to
+        :rtype: list
+        """
+        self.tiles[pos] = tileobj
+        if not connect:
+            return []
+
+        return self.connect(pos)
+
+    def place_tiles(self, tiles, positions):
+        """
+        Put many tiles on the grid at once. Tiles are not linked to each other;
+        links are expected to be set already, e.g. by tgmdata.MapLoader
+
+        :param list tiles: tiles to place
+        :param dict positions: grid positions of tiles, keyed by tile ID.\
+            Tiles with no position are not placed
+        :return: positions of the placed tiles
+        :rtype: list
+        """
+        placed = []
+        for tileobj in tiles:
+            if tileobj.tile_id not in positions:
+                continue
+
+            pos = tuple(positions[tileobj.tile_id])
+            self.tiles[pos] = tileobj
+            placed.append(pos)
+
+        return placed
+
+    def remove(self, pos):
+        """
+        Remove the tile at a grid position, unlinking it from adjacent tiles and
+        releasing its tile ID
+
+        :param tuple pos: (y, x) grid position
+        :return: positions of the adjacent tiles that were unlinked from
+        :rtype: list
+        """
+        tileobj = self.tiles[pos]
+        tile.unregister_tile_id(tileobj.tile_id)
+        neighbours = self.disconnect(pos)
+        del self.tiles[pos]
+
+        if self.start_position == pos:
+            self.start_position = None
+
+        return neighbours
+
+    def clear(self):
+        self.tiles.clear()
+        self.attrs_cache.clear()
+        self.tile_ids.reset()
+        self.start_position = None
+
+    def move_region(self, src_positions, dest_positions):
+        """
+        Move a group of tiles to new grid positions. Links between tiles in the
+        group are kept, links to tiles outside the group are removed
+
+        :param list src_positions: positions of the tiles to move
+        :param list dest_positions: new positions, one for each position in\
+            src_positions
+        :return: positions of tiles outside the group that were unlinked from
+        :rtype: set
+        """
+        src_set = set(src_positions)
+        self.mark_dirty(src_positions)
+
+        # Find all links that cross the edge of the group, before anything is
+        # changed; these are the only links that need to be severed
+        boundary = []
+        for pos in src_positions:
+            for direction in DIRECTIONS:
+                delta_y, delta_x = MOVE_MAP[direction]
+                adj_pos = (pos[0] + delta_y, pos[1] + delta_x)
+
+                if (adj_pos not in src_set) and (adj_pos in self.tiles):
+                    boundary.append((pos, direction, adj_pos))
+
+        for pos, direction, adj_pos in boundary:
+            setattr(self.tiles[pos], direction, None)
+            setattr(self.tiles[adj_pos], tile.reverse_direction(direction), None)
+
+        # Remove all tiles before adding any, in case the old and new positions
+        # overlap
+        src_tiles = [self.tiles.pop(pos) for pos in src_positions]
+        self.tiles.update(zip(dest_positions, src_tiles))
+
+        if self.start_position in src_set:
+            index = src_positions.index(self.start_position)
+            self.start_position = dest_positions[index]
+
+        return set(adj_pos for _, _, adj_pos in boundary)
+
+    def copy_region(self, src_positions, dest_positions):
+        """
+        Copy a group of tiles to new grid positions. Links between tiles in the
+        group are copied, links to tiles outside the group are not. Doors are
+        copied along with the tiles they belong to
+
+        :param list src_positions: positions of the tiles to copy
+        :param list dest_positions: positions of the copies, one for each\
+            position in src_positions
+        :return: the new tiles, in the same order as dest_positions
+        :rtype: list
+        """
+        src_tiles = [self.tiles[pos] for pos in src_positions]
+
+        # IDs for all copied tiles and doors are allocated up front
+        src_ids = [t.tile_id for t in src_tiles]
+        for src_tile in src_tiles:
+            src_ids.extend([adj.tile_id for adj in src_tile.iterate_directions()
+                            if adj.is_door()])
+
+        tile_id_map = self.tile_ids.reserve(src_ids)
+
+        # Create all the new tiles
+        new_tiles = []
+        for src_tile in src_tiles:
+            tileobj = copy_tile(src_tile)
+            tileobj.tile_id = None
+            tileobj.set_tile_id(tile_id_map[src_tile.tile_id])
+            new_tiles.append(tileobj)
+
+        # Populate & connect all the new tiles
+        for src_tile, dest_tile in zip(src_tiles, new_tiles):
+            for direction in DIRECTIONS:
+                src_adj = getattr(src_tile, direction)
+                if src_adj is None:
+                    dest_adj = None
+
+                elif src_adj.is_door():
+                    door_copy = copy_door(src_adj)
+                    door_copy.tile_id = None
+                    door_copy.set_tile_id(tile_id_map[src_adj.tile_id])
+                    door_copy.source_tile = dest_tile
+                    door_copy.replacement_tile = None
+                    dest_adj = door_copy
+
+                elif src_adj.tile_id in tile_id_map:
+                    dest_adj = tile.get_tile_by_id(tile_id_map[src_adj.tile_id])
+                    if dest_adj is None:
+                        setattr(dest_tile, direction, None)
+                        continue
+
+                    reverse_ptr = getattr(dest_adj, tile.reverse_direction(direction))
+                    if reverse_ptr and reverse_ptr.is_door():
+                        reverse_ptr.replacement_tile = dest_tile
+                else:
+                    dest_adj = None
+
+                setattr(dest_tile, direction, dest_adj)
+
+        for dest_pos, dest_tile in zip(dest_positions, new_tiles):
+            self.tiles[dest_pos] = dest_tile
+
+        return new_tiles
+
+    def serialize(self):
+        return tgmdata.serialize(self.tiles[self.start_position], self.tiles,
+                                 self.attrs_cache)
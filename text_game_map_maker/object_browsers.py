@@ -219,6 +219,8 @@ class ItemBrowser(QtWidgets.QDialog):
         if not builder.edit_instance(item, formclass=form):
             return
 
+        self.itemEdited(selectedRow, item)
+
         # Re-draw door browser table
         self.populateTable()
 
@@ -255,6 +257,9 @@ class ItemBrowser(QtWidgets.QDialog):
     def deleteItemFromContainer(self, item):
         pass
 
+    def itemEdited(self, row, item):
+        pass
+
     def getRowInfo(self, item):
         raise NotImplementedError()
 
@@ -339,16 +344,27 @@ class SavedItemBrowser(ItemBrowser):
 
     def populateTable(self):
         self.row_items = []
+        self.row_names = []
 
         self.table.setRowCount(0)
-        saved_objs = saved_objects.get_objects()
-        for name in saved_objs:
-            self.addRow(saved_objs[name])
-            self.row_items.append(saved_objs[name])
+        for name in saved_objects.get_object_names():
+            item = saved_objects.get_object_by_name(name)
+            self.addRow(item)
+            self.row_items.append(item)
+            self.row_names.append(name)
 
     def addItemToContainer(self, item):
         saved_objects.save_object(item)
 
+        # Re-draw table, so that rows line up with saved object names
+        self.populateTable()
+
+    def itemEdited(self, row, item):
+        # Table rows hold copies of the saved objects, so the edited copy must
+        # replace the saved object (whose name may have changed)
+        saved_objects.delete_object_by_name(self.row_names[row])
+        saved_objects.save_object(item)
+
     def getRowInfo(self, item):
         return item.__class__.__name__, item.name, "Saved objects"
 
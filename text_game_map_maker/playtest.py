@@ -0,0 +1,258 @@
+"""
+Runs maps in a separate process for playtesting, so that a game which never
+returns (or uses lots of memory) can't freeze or bloat the map editor. Also
+runs maps with no player, feeding them a script of commands. Nothing here
+imports PyQt5.
+
+The game process sends messages to the editor over a pipe. Each message is a
+tuple of the form (message_type, data). Lines of input typed by the player are
+sent back over the same pipe, as plain strings.
+"""
+
+import time
+import multiprocessing
+
+from text_game_maker.builder.map_builder import clear_instance
+from text_game_maker.utils import utils
+from text_game_maker.utils.runner import MapRunner, run_map_from_class
+
+
+# Sent once the map has been loaded and the game is about to start. No data.
+MSG_READY = "ready"
+
+# Sent for each line printed by the game. Data is the line of text.
+MSG_OUTPUT = "output"
+
+# Maximum time to wait for the game process to exit after asking it to stop
+STOP_TIMEOUT_SECONDS = 1.0
+
+
+class ScriptFinished(Exception):
+    """
+    Raised by Playthrough.inputfunc when the game asks for input after the
+    last command in the script, to stop the game
+    """
+    pass
+
+
+def run_map(map_data, printfunc, inputfunc, on_ready=None):
+    """
+    Run a map in this process, until the game exits. Only one game can run
+    in a process at a time
+
+    :param str map_data: serialized map data, in JSON format
+    :param printfunc: function called with each line printed by the game
+    :param inputfunc: function called with a prompt when the game wants a\
+        line of input, returns the line
+    :param on_ready: function called once the map has been loaded, with no\
+        arguments. If None, nothing is called
+    """
+    utils.set_printfunc(printfunc)
+    utils.set_inputfunc(inputfunc)
+
+    class PlaytestMapRunner(MapRunner):
+        def build_map(self, builder):
+            builder.load_map_data_from_string(map_data)
+            builder.set_input_prompt("")
+            if on_ready is not None:
+                on_ready()
+
+    try:
+        run_map_from_class(PlaytestMapRunner)
+    finally:
+        # Allow another game to be run in this process
+        clear_instance()
+
+def _run_game(map_data, conn):
+    """
+    Entry point for the game process
+
+    :param str map_data: serialized map data, in JSON format
+    :param multiprocessing.connection.Connection conn: connection to the\
+        editor process
+    """
+    def printfunc(text):
+        conn.send((MSG_OUTPUT, text))
+
+    def inputfunc(prompt):
+        printfunc("> ")
+        return conn.recv()
+
+    def on_ready():
+        conn.send((MSG_READY, None))
+
+    try:
+        run_map(map_data, printfunc, inputfunc, on_ready)
+    except (EOFError, OSError):
+        # Editor closed its end of the pipe
+        pass
+    finally:
+        conn.close()
+
+class Playtest(object):
+    """
+    Runs a map in a new process, and provides access to the game's output and
+    input
+    """
+    def __init__(self, map_data):
+        """
+        :param str map_data: serialized map data, in JSON format
+        """
+        # Start a fresh interpreter rather than forking the editor, so the game
+        # process gets none of the editor's memory or threads
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_run_game,
+                                       args=(map_data, child_conn))
+        self.process.daemon = True
+
+        self.startup_time = None
+        self.start_time = time.perf_counter()
+        self.process.start()
+        child_conn.close()
+
+    def receive(self):
+        """
+        Wait for the next message from the game process
+
+        :return: message of the form (message_type, data)
+        :rtype: tuple
+        :raises EOFError: if the game process has exited
+        """
+        try:
+            msgtype, data = self.conn.recv()
+        except OSError:
+            raise EOFError("game process has exited")
+
+        if msgtype == MSG_READY:
+            self.startup_time = time.perf_counter() - self.start_time
+
+        return msgtype, data
+
+    def send_input(self, text):
+        """
+        Send a line of input to the game process. Does nothing if the game
+        process has already exited.
+
+        :param str text: line of input
+        """
+        try:
+            self.conn.send(text)
+        except OSError:
+            pass
+
+    def is_running(self):
+        return self.process.is_alive()
+
+    def stop(self):
+        """
+        Stop the game process, killing it if it does not exit on its own
+        """
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(STOP_TIMEOUT_SECONDS)
+
+        if self.process.is_alive():
+            self.process.kill()
+
+        self.process.join()
+
+    def close(self):
+        """
+        Stop the game process, and close the connection to it
+        """
+        self.stop()
+        self.conn.close()
+
+class Playthrough(object):
+    """
+    Runs a map in this process with no player, feeding it a script of
+    commands, and records the output of the game and the time taken by each
+    command
+    """
+    def __init__(self, commands):
+        """
+        :param list commands: commands to enter, in order
+        """
+        self.commands = list(commands)
+        self.next_command = 0
+        self.output = []
+
+        # Time taken by each command, from when the command was entered until
+        # the game was ready for more input (or exited)
+        self.latencies = []
+
+        self.startup_time = None
+        self.total_time = None
+        self.command_start = None
+        self.start_time = None
+
+    def printfunc(self, text):
+        self.output.append(text)
+
+    def inputfunc(self, prompt):
+        self.command_finished()
+
+        if self.next_command >= len(self.commands):
+            raise ScriptFinished()
+
+        command = self.commands[self.next_command]
+        self.next_command += 1
+        self.output.append("> %s" % command)
+
+        self.command_start = time.perf_counter()
+        return command
+
+    def command_finished(self):
+        if self.command_start is not None:
+            self.latencies.append(time.perf_counter() - self.command_start)
+            self.command_start = None
+
+    def on_ready(self):
+        self.startup_time = time.perf_counter() - self.start_time
+
+    def run(self, map_data):
+        """
+        Run the map until the script runs out of commands, or the game exits
+
+        :param str map_data: serialized map data, in JSON format
+        """
+        self.start_time = time.perf_counter()
+
+        try:
+            run_map(map_data, self.printfunc, self.inputfunc, self.on_ready)
+        except (ScriptFinished, SystemExit):
+            pass
+
+        self.command_finished()
+        self.total_time = time.perf_counter() - self.start_time
+
+    def commands_per_second(self):
+        """
+        :return: number of commands run per second, not counting the time\
+            taken to load the map
+        :rtype: float
+        """
+        elapsed = sum(self.latencies)
+        if not elapsed:
+            return 0.0
+
+        return len(self.latencies) / elapsed
+
+def read_script(filename):
+    """
+    Read a script of commands for a playthrough. Each line holds one command.
+    Blank lines, and lines starting with '#', are skipped
+
+    :param str filename: name of script file
+    :return: list of commands
+    :rtype: [str]
+    """
+    commands = []
+    with open(filename, 'r') as fh:
+        for line in fh:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                commands.append(line)
+
+    return commands
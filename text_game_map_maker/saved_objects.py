@@ -1,24 +1,72 @@
-import copy
+import pickle
+import marshal
+
+from collections import OrderedDict
 
 from text_game_maker.game_objects.base import serialize, deserialize
 from text_game_maker.game_objects import __object_model_version__ as obj_version
 
 
+# Max. number of deserialized saved objects kept in _prototypes
+PROTOTYPE_CACHE_SIZE = 32
+
+# Saved objects are stored frozen, as pickled object graphs, and a new instance
+# is unpickled each time one is requested. Unpickling is several times faster
+# than copy.deepcopy on the same graph, and the frozen form is compact. Frozen
+# objects are only ever created by this module, never read from files.
+#
+# Objects loaded from a save file are stored as serialized attrs instead, and
+# are only deserialized when first requested. The frozen result is kept in
+# _prototypes, which holds the most recently used PROTOTYPE_CACHE_SIZE objects
 _objects = {}
+_prototypes = OrderedDict()
 
 
 def _obj_name(obj):
     return "(%s) %s %s" % (obj.__class__.__name__, obj.prefix, obj.name)
 
+def _freeze(obj):
+    # Don't pull the object's container into the saved copy
+    has_home = hasattr(obj, 'home')
+    if has_home:
+        home = obj.home
+        obj.home = None
+
+    try:
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        if has_home:
+            obj.home = home
+
+def _thaw(frozen):
+    return pickle.loads(frozen)
+
+def _prototype(name):
+    attrs = _objects[name]
+    if isinstance(attrs, bytes):
+        return attrs
+
+    if name in _prototypes:
+        _prototypes.move_to_end(name)
+        return _prototypes[name]
+
+    # Deserializing modifies attrs, so work on a copy; the original attrs are
+    # kept for get_objects, and in case the prototype is evicted
+    frozen = _freeze(deserialize(marshal.loads(marshal.dumps(attrs)), obj_version))
+    _prototypes[name] = frozen
+
+    if len(_prototypes) > PROTOTYPE_CACHE_SIZE:
+        _prototypes.popitem(last=False)
+
+    return frozen
+
 def save_object(obj):
     """
     Save an object for later re-use
     """
     name = _obj_name(obj)
-    if hasattr(obj, 'home'):
-        obj.home = None
-
-    _objects[name] = copy.deepcopy(obj)
+    _objects[name] = _freeze(obj)
+    _prototypes.pop(name, None)
 
 def get_object_names():
     """
@@ -30,16 +78,24 @@ def get_objects():
     """
     Returns all serialized object data
     """
-    return _objects
+    ret = {}
+    for name in _objects:
+        attrs = _objects[name]
+        if isinstance(attrs, bytes):
+            attrs = serialize(_thaw(attrs))
+
+        ret[name] = attrs
+
+    return ret
 
 def set_objects(objs):
     """
-    Replace saved objects with serialized objects from save file
+    Replace saved objects with serialized objects from save file. Objects are
+    not deserialized until they are requested
     """
     _objects.clear()
-    for name in objs:
-        attrs = objs[name]
-        _objects[name] = deserialize(attrs, obj_version)
+    _prototypes.clear()
+    _objects.update(objs)
 
 def get_object_by_name(name):
     """
@@ -48,21 +104,20 @@ def get_object_by_name(name):
     if name not in _objects:
         return None
 
-    return copy.deepcopy(_objects[name])
+    return _thaw(_prototype(name))
 
 def clear_objects():
     """
     Clear all saved objects
     """
-    _objects = {}
+    _objects.clear()
+    _prototypes.clear()
 
 def delete_object(obj):
     """
     Delete a saved object
     """
-    name = _obj_name(obj)
-    if name in _objects:
-        del _objects[name]
+    delete_object_by_name(_obj_name(obj))
 
 def delete_object_by_name(name):
     """
@@ -70,3 +125,5 @@ def delete_object_by_name(name):
     """
     if name in _objects:
         del _objects[name]
+
+    _prototypes.pop(name, None)
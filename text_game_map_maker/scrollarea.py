@@ -5,13 +5,17 @@ class ScrollArea(QtWidgets.QScrollArea):
     """
     Custom QScrollArea that ignores mouse wheel events, and implements custom
     custom scrolling behaviour where content can be scrolled in a particular
-    direction by moving the cursor to the corresponding inner edge of the scrollarea
+    direction by moving the cursor to the corresponding inner edge of the scrollarea.
+    The closer the cursor is to the edge, the faster the content scrolls.
+
+    Cursor movement is watched by a single event filter on the viewport. Mouse
+    move events that the scrolled widget ignores are passed on to the viewport,
+    so the scrolled widget needs mouse tracking enabled, and must ignore mouse
+    move events, for auto-scrolling to work while the cursor is over it
     """
 
-    LEFT = 0    # Left side of scrollarea
-    RIGHT = 1   # Right side of scrollarea
-    TOP = 2     # Top side of scrollarea
-    BOTTOM = 3  # Bottom side of scroll area
+    # Emitted after the contents have been auto-scrolled
+    autoScrolled = QtCore.pyqtSignal()
 
     def __init__(self, parent=None):
         super(ScrollArea, self).__init__(parent)
@@ -21,85 +25,151 @@ class ScrollArea(QtWidgets.QScrollArea):
         # until the cursor leaves the border area.
         self.border_width = 50
 
-        # Time (in milliseconds) between scrollbar updates when auto-scrolling.
-        self.timer_delay_ms = 33
+        # Auto-scrolling speed (in pixels per second) when the cursor is right
+        # at the edge of the scrollarea. Speed drops off towards the inside
+        # edge of the border.
+        self.max_speed = 1500.0
+
+        # Time (in seconds) taken for auto-scrolling to speed up or slow down
+        # to the speed set by the cursor position
+        self.ramp_time = 0.25
+
+        # Time (in milliseconds) between scrollbar updates when auto-scrolling,
+        # roughly one per frame at 60 frames per second
+        self.frame_ms = 16
 
-        # When auto-scrolling, scrollbars are incremented/decremented by this
-        # amount on each scrollbar update. Determined purely by trial-and-error.
-        self.increment = 15
+        # (x, y) auto-scrolling speed set by the cursor position, the current
+        # auto-scrolling speed, and the fractions of a pixel not yet scrolled
+        self.target_velocity = (0.0, 0.0)
+        self.velocity = (0.0, 0.0)
+        self.remainder = (0.0, 0.0)
 
-        self.scroll_directions = []
+        # The timer only runs while the cursor is inside the border
+        self.frame_clock = QtCore.QElapsedTimer()
+        self.scroll_timer = QtCore.QTimer(self)
+        self.scroll_timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.scroll_timer.setInterval(self.frame_ms)
+        self.scroll_timer.timeout.connect(self.scrollFrame)
 
-        self.mouse_timer = QtCore.QTimer(self)
-        self.mouse_timer.timeout.connect(self.updateScrollbars)
-        self.mouse_timer.start(100)
+        self.viewport().setMouseTracking(True)
+        self.viewport().installEventFilter(self)
 
     def wheelEvent(self, ev):
         if ev.type() == QtCore.QEvent.Wheel:
             ev.ignore()
 
     def leaveEvent(self, e):
-        if self.mouse_timer.isActive():
-            self.mouse_timer.stop()
-
-    def mouseMoveEvent(self, event):
-        new_dirs = self.checkScrollBorders(event.pos().x(), event.pos().y())
-        if new_dirs == self.scroll_directions:
-            return
-
-        self.scroll_directions = new_dirs
-        if not new_dirs:
-            self.mouse_timer.stop()
-            return
-
-        self.mouse_timer.start(self.timer_delay_ms)
-
-    def checkScrollBorders(self, x, y):
-        width = self.frameGeometry().width()
-        height = self.frameGeometry().height()
-        ret = []
-
-        if x < self.border_width:
-            ret.append(self.LEFT)
-
-        if x > (width - self.border_width):
-            ret.append(self.RIGHT)
-
-        if y < self.border_width:
-            ret.append(self.TOP)
-
-        if y > (height - self.border_width):
-            ret.append(self.BOTTOM)
-
-        return ret
-
-    def updateScrollbars(self):
-        if self.LEFT in self.scroll_directions:
-            curr = self.horizontalScrollBar().value()
-            self.horizontalScrollBar().setValue(max(0, curr - self.increment))
-
-        if self.RIGHT in self.scroll_directions:
-            max_value = self.horizontalScrollBar().maximum()
-            curr = self.horizontalScrollBar().value()
-            self.horizontalScrollBar().setValue(min(max_value, curr + self.increment))
-
-        if self.TOP in self.scroll_directions:
-            curr = self.verticalScrollBar().value()
-            self.verticalScrollBar().setValue(max(0, curr - self.increment))
-
-        if self.BOTTOM in self.scroll_directions:
-            max_value = self.verticalScrollBar().maximum()
-            curr = self.verticalScrollBar().value()
-            self.verticalScrollBar().setValue(min(max_value, curr + self.increment))
-
-    def setMouseTracking(self, flag):
-        def recursive_set(parent):
-            for child in parent.findChildren(QtCore.QObject):
-                try:
-                    child.setMouseTracking(flag)
-                except:
-                    pass
-                recursive_set(child)
-
-        super(ScrollArea, self).setMouseTracking(flag)
-        recursive_set(self)
+        self.stopAutoScroll()
+
+    def hideEvent(self, e):
+        self.stopAutoScroll()
+        super(ScrollArea, self).hideEvent(e)
+
+    def changeEvent(self, e):
+        # Don't keep scrolling while another window has focus
+        if (e.type() == QtCore.QEvent.ActivationChange) and not self.isActiveWindow():
+            self.stopAutoScroll()
+
+        super(ScrollArea, self).changeEvent(e)
+
+    def eventFilter(self, obj, event):
+        if (obj is self.viewport()) and (event.type() == QtCore.QEvent.MouseMove):
+            self.setAutoScrollTarget(event.pos())
+
+        return False
+
+    def setAutoScrollTarget(self, pos):
+        """
+        Start, stop, or change the speed of auto-scrolling, based on the cursor
+        position
+
+        :param QtCore.QPoint pos: cursor position, relative to the viewport
+        """
+        rect = self.viewport().rect()
+        self.target_velocity = (
+            self.edgeSpeed(pos.x(), rect.width()),
+            self.edgeSpeed(pos.y(), rect.height())
+        )
+
+        if self.target_velocity == (0.0, 0.0):
+            self.stopAutoScroll()
+        elif (not self.scroll_timer.isActive()) and self.isActiveWindow():
+            self.frame_clock.start()
+            self.scroll_timer.start()
+
+    def edgeSpeed(self, pos, size):
+        """
+        Get the auto-scrolling speed along one axis for a cursor position
+
+        :param int pos: cursor position along the axis
+        :param int size: size of the scrollarea along the axis
+        :return: speed in pixels per second. Negative when the cursor is near\
+            the start of the axis, positive when near the end, 0 otherwise
+        :rtype: float
+        """
+        if pos < self.border_width:
+            depth = self.border_width - pos
+            sign = -1.0
+        elif pos > (size - self.border_width):
+            depth = pos - (size - self.border_width)
+            sign = 1.0
+        else:
+            return 0.0
+
+        # Speed grows with the square of the distance into the border, so the
+        # cursor can be placed just inside the border for fine scrolling
+        fraction = min(1.0, float(depth) / self.border_width)
+        return sign * self.max_speed * fraction * fraction
+
+    def stopAutoScroll(self):
+        self.scroll_timer.stop()
+        self.target_velocity = (0.0, 0.0)
+        self.velocity = (0.0, 0.0)
+        self.remainder = (0.0, 0.0)
+
+    def scrollFrame(self):
+        # Scroll by elapsed time rather than by timer ticks, so scrolling speed
+        # stays the same when frames are late
+        elapsed = self.frame_clock.restart() / 1000.0
+        ramp = min(1.0, elapsed / self.ramp_time)
+
+        bars = (self.horizontalScrollBar(), self.verticalScrollBar())
+        velocity = []
+        remainder = []
+        moved = False
+
+        for bar, speed, target, rest in zip(bars, self.velocity,
+                                            self.target_velocity, self.remainder):
+            speed += (target - speed) * ramp
+            distance = (speed * elapsed) + rest
+            pixels = int(distance)
+
+            if pixels != 0:
+                old_value = bar.value()
+                bar.setValue(old_value + pixels)
+                moved = moved or (bar.value() != old_value)
+
+            velocity.append(speed)
+            remainder.append(distance - pixels)
+
+        self.velocity = tuple(velocity)
+        self.remainder = tuple(remainder)
+
+        if moved:
+            self.autoScrolled.emit()
+
+        # Nothing left to scroll in the direction(s) the cursor is pointing
+        if (not moved) and self.atScrollLimits():
+            self.stopAutoScroll()
+
+    def atScrollLimits(self):
+        bars = (self.horizontalScrollBar(), self.verticalScrollBar())
+
+        for bar, target in zip(bars, self.target_velocity):
+            if (target < 0) and (bar.value() > bar.minimum()):
+                return False
+
+            if (target > 0) and (bar.value() < bar.maximum()):
+                return False
+
+        return True
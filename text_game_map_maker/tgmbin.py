@@ -0,0 +1,415 @@
+"""
+Compact binary encoding for serialized map data (the dict produced by
+tgmdata.serialize).
+
+A binary map file starts with a fixed header:
+
+    magic (4 bytes) | format version (uint16) | reserved (uint16)
+
+followed by a zlib-compressed body made of length-prefixed sections:
+
+    metadata | string table | tile columns | attribute columns
+
+The metadata section is JSON holding all top-level map data items except tile
+data and positions, plus a description of the columns that follow. The string
+table is a JSON list of every unique string used in tile data. Tiles are stored
+as columns; tile positions and links between tiles are fixed-width integer
+columns, and tiles with the same set of attributes share one column per
+attribute. All integers are little-endian.
+"""
+
+import sys
+import json
+import argparse
+import zlib
+import array
+import struct
+
+from operator import itemgetter
+
+from text_game_maker.player import player
+
+from text_game_map_maker import tgmdata
+
+
+MAGIC = b"TGMB"
+FORMAT_VERSION = 1
+
+_header = struct.Struct("<4sHH")
+_length = struct.Struct("<I")
+
+# Serialized tile attributes holding tile IDs of other tiles, stored as
+# fixed-width columns of indices into the tile table
+LINK_KEYS = ['north', 'south', 'east', 'west', 'source_tile', 'replacement_tile']
+
+# Values in link columns, other than indices into the tile table (which are
+# offset by LINK_BASE)
+LINK_ABSENT = 0
+LINK_NONE = 1
+LINK_BASE = 2
+
+# Value in string columns for None
+NULL_STRING = 0xffffffff
+
+# Column kinds
+KIND_STRING = "s"   # indices into string table, or NULL_STRING for None
+KIND_BOOL = "b"     # one byte per value
+KIND_INT = "q"      # signed 64-bit integers
+KIND_FLOAT = "d"    # doubles
+KIND_NONE = "n"     # all values None, no column data
+KIND_JSON = "j"     # JSON list of distinct values, followed by indices into it
+
+_typecodes = {
+    KIND_STRING: 'I',
+    KIND_BOOL: 'B',
+    KIND_INT: 'q',
+    KIND_FLOAT: 'd',
+    KIND_JSON: 'I'
+}
+
+_INT64_MIN = -(2 ** 63)
+_INT64_MAX = (2 ** 63) - 1
+
+
+class BinaryFormatError(Exception):
+    pass
+
+
+def is_binary(data):
+    """
+    Check whether data is the start of a binary map file
+
+    :param bytes data: first bytes of file
+    :return: True if data starts with the binary map file magic
+    :rtype: bool
+    """
+    return data[:len(MAGIC)] == MAGIC
+
+def _array_bytes(typecode, values):
+    arr = array.array(typecode, values)
+    if sys.byteorder == 'big':
+        arr.byteswap()
+
+    return arr.tobytes()
+
+def _bytes_array(typecode, data):
+    arr = array.array(typecode)
+    arr.frombytes(data)
+    if sys.byteorder == 'big':
+        arr.byteswap()
+
+    return arr
+
+
+class _StringTable(object):
+    def __init__(self):
+        self.strings = []
+        self.indices = {}
+
+    def index(self, string):
+        if string not in self.indices:
+            self.indices[string] = len(self.strings)
+            self.strings.append(string)
+
+        return self.indices[string]
+
+
+def _column_kind(values):
+    types = set(map(type, values))
+
+    if types == {type(None)}:
+        return KIND_NONE
+    if types <= {str, type(None)}:
+        return KIND_STRING
+    if types == {bool}:
+        return KIND_BOOL
+    if types == {int} and (_INT64_MIN <= min(values)) and (max(values) <= _INT64_MAX):
+        return KIND_INT
+    if types == {float}:
+        return KIND_FLOAT
+
+    return KIND_JSON
+
+def _copy_value(value):
+    if isinstance(value, dict):
+        return {k: _copy_value(v) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [_copy_value(v) for v in value]
+
+    return value
+
+def _encode_column(values, strings):
+    kind = _column_kind(values)
+
+    if kind == KIND_NONE:
+        data = b""
+    elif kind == KIND_STRING:
+        data = _array_bytes('I', [NULL_STRING if v is None else strings.index(v)
+                                  for v in values])
+    elif kind == KIND_JSON:
+        # repr() is used to find distinct values, since it's much cheaper than
+        # JSON-encoding every value
+        distinct = {}
+        indices = []
+        for v in values:
+            indices.append(distinct.setdefault(repr(v), (len(distinct), v))[0])
+
+        table = json.dumps([v for _, v in distinct.values()]).encode("utf-8")
+        data = _length.pack(len(table)) + table + _array_bytes('I', indices)
+    else:
+        data = _array_bytes(_typecodes[kind], values)
+
+    return kind, data
+
+def _decode_column(kind, data, count, strings):
+    if kind == KIND_NONE:
+        return [None] * count
+
+    if kind == KIND_JSON:
+        size, = _length.unpack_from(data)
+        start = _length.size + size
+        table = json.loads(bytes(data[_length.size:start]).decode("utf-8"))
+
+        # Tile deserialization modifies containers in place, so each tile gets
+        # its own copy
+        return [_copy_value(table[i]) for i in _bytes_array('I', data[start:])]
+
+    values = _bytes_array(_typecodes[kind], data)
+
+    if kind == KIND_STRING:
+        return [None if i == NULL_STRING else strings[i] for i in values]
+    elif kind == KIND_BOOL:
+        return [bool(v) for v in values]
+
+    return values.tolist()
+
+def encode(attrs):
+    """
+    Encode serialized map data in the binary format
+
+    :param dict attrs: serialized map data, as returned by tgmdata.serialize
+    :return: encoded map data
+    :rtype: bytes
+    """
+    tile_lists = [attrs[player.TILES_KEY]] + list(attrs.get(tgmdata.ISLANDS_KEY, []))
+    positions = attrs.get(tgmdata.POSITIONS_KEY, {})
+
+    tiles = []
+    groups = []
+    for group, tile_list in enumerate(tile_lists):
+        tiles.extend(tile_list)
+        groups.extend([group] * len(tile_list))
+
+    tile_indices = {}
+    for i, tiledata in enumerate(tiles):
+        tile_indices[tiledata["tile_id"]] = i
+
+    strings = _StringTable()
+    meta = {k: attrs[k] for k in attrs if k not in (player.TILES_KEY,
+                                                   tgmdata.ISLANDS_KEY,
+                                                   tgmdata.POSITIONS_KEY)}
+    columns = []
+
+    # Tile IDs, tile list membership, and positions
+    columns.append(_encode_column([t["tile_id"] for t in tiles], strings))
+    columns.append(('I', _array_bytes('I', groups)))
+
+    has_position = []
+    ys = []
+    xs = []
+    for tiledata in tiles:
+        # Position keys are strings if attrs has been through JSON
+        tile_id = tiledata["tile_id"]
+        pos = positions.get(tile_id, positions.get(str(tile_id), None))
+        has_position.append(0 if pos is None else 1)
+        ys.append(0 if pos is None else pos[0])
+        xs.append(0 if pos is None else pos[1])
+
+    columns.append(('B', _array_bytes('B', has_position)))
+    columns.append(('i', _array_bytes('i', ys)))
+    columns.append(('i', _array_bytes('i', xs)))
+
+    # Links between tiles. A link column is only used for a key if every
+    # value of that key refers to a tile in the map, otherwise the key is
+    # stored with the other attributes
+    link_keys = []
+    for key in LINK_KEYS:
+        links = []
+        for tiledata in tiles:
+            value = tiledata.get(key, links)
+            if value is links:
+                links.append(LINK_ABSENT)
+            elif value is None:
+                links.append(LINK_NONE)
+            elif value in tile_indices:
+                links.append(LINK_BASE + tile_indices[value])
+            else:
+                break
+        else:
+            link_keys.append(key)
+            columns.append(('I', _array_bytes('I', links)))
+
+    # Remaining attributes, grouped by the set of keys each tile has
+    skip_keys = set(link_keys + ["tile_id"])
+    shape_indices = {}
+    shapes = []
+    shape_column = []
+
+    # Most tiles have the same keys in the same order, so shapes are looked up
+    # by the full key list first
+    key_shapes = {}
+
+    for tiledata in tiles:
+        keys = tuple(tiledata)
+        if keys not in key_shapes:
+            shape = tuple(k for k in keys if k not in skip_keys)
+            if shape not in shape_indices:
+                shape_indices[shape] = len(shapes)
+                shapes.append((shape, []))
+
+            key_shapes[keys] = shape_indices[shape]
+
+        shapes[key_shapes[keys]][1].append(tiledata)
+        shape_column.append(key_shapes[keys])
+
+    columns.append(('I', _array_bytes('I', shape_column)))
+
+    shape_meta = []
+    for shape, members in shapes:
+        kinds = []
+        for key in shape:
+            kind, data = _encode_column(list(map(itemgetter(key), members)), strings)
+            kinds.append(kind)
+            columns.append((kind, data))
+
+        shape_meta.append([list(shape), kinds])
+
+    meta["tiles"] = {
+        "count": len(tiles),
+        "groups": len(tile_lists),
+        "tile_id_kind": columns[0][0],
+        "link_keys": link_keys,
+        "shapes": shape_meta
+    }
+
+    body = [json.dumps(meta).encode("utf-8"),
+            json.dumps(strings.strings).encode("utf-8")]
+    body.extend(data for _, data in columns)
+
+    compressor = zlib.compressobj()
+    chunks = [_header.pack(MAGIC, FORMAT_VERSION, 0)]
+    for section in body:
+        chunks.append(compressor.compress(_length.pack(len(section))))
+        chunks.append(compressor.compress(section))
+
+    chunks.append(compressor.flush())
+    return b"".join(chunks)
+
+def decode(data):
+    """
+    Decode map data in the binary format. Decoded map data can be passed to
+    tgmdata.deserialize, which will apply any migrations needed
+
+    :param bytes data: encoded map data
+    :return: serialized map data
+    :rtype: dict
+    """
+    if len(data) < _header.size:
+        raise BinaryFormatError("Binary map data is truncated")
+
+    magic, version, _ = _header.unpack_from(data)
+    if magic != MAGIC:
+        raise BinaryFormatError("Not binary map data")
+
+    if version > FORMAT_VERSION:
+        raise BinaryFormatError("Binary map data format version %d is newer "
+                                "than the newest supported version (%d)"
+                                % (version, FORMAT_VERSION))
+
+    body = memoryview(zlib.decompress(data[_header.size:]))
+    offset = 0
+
+    def _section():
+        nonlocal offset
+        if offset + _length.size > len(body):
+            raise BinaryFormatError("Binary map data is truncated")
+
+        size, = _length.unpack_from(body, offset)
+        offset += _length.size + size
+        return body[offset - size:offset]
+
+    meta = json.loads(bytes(_section()).decode("utf-8"))
+    strings = json.loads(bytes(_section()).decode("utf-8"))
+    tilemeta = meta.pop("tiles")
+    count = tilemeta["count"]
+
+    tile_ids = _decode_column(tilemeta["tile_id_kind"], _section(), count, strings)
+    groups = _bytes_array('I', _section())
+    has_position = _bytes_array('B', _section())
+    ys = _bytes_array('i', _section())
+    xs = _bytes_array('i', _section())
+
+    tiles = [{} for _ in range(count)]
+    for key in tilemeta["link_keys"]:
+        for tiledata, link in zip(tiles, _bytes_array('I', _section())):
+            if link == LINK_NONE:
+                tiledata[key] = None
+            elif link != LINK_ABSENT:
+                tiledata[key] = tile_ids[link - LINK_BASE]
+
+    shape_column = _bytes_array('I', _section())
+    members = [[] for _ in tilemeta["shapes"]]
+    for i, shape in enumerate(shape_column):
+        members[shape].append(i)
+
+    for (keys, kinds), indices in zip(tilemeta["shapes"], members):
+        for key, kind in zip(keys, kinds):
+            values = _decode_column(kind, _section(), len(indices), strings)
+            for i, value in zip(indices, values):
+                tiles[i][key] = value
+
+    attrs = meta
+    attrs[tgmdata.POSITIONS_KEY] = {}
+    tile_lists = [[] for _ in range(tilemeta["groups"])]
+
+    for i, tiledata in enumerate(tiles):
+        tiledata["tile_id"] = tile_ids[i]
+        tile_lists[groups[i]].append(tiledata)
+
+        if has_position[i]:
+            attrs[tgmdata.POSITIONS_KEY][str(tile_ids[i])] = [ys[i], xs[i]]
+
+    attrs[player.TILES_KEY] = tile_lists[0]
+    attrs[tgmdata.ISLANDS_KEY] = tile_lists[1:]
+    return attrs
+
+def convert(infile, outfile):
+    """
+    Convert a map file between the binary format and the compressed JSON
+    format. The format of the input file is detected from its contents, and
+    the format of the output file is chosen by its suffix (see
+    tgmdata.write_file)
+
+    :param str infile: name of map file to convert
+    :param str outfile: name of converted map file to write
+    """
+    with open(infile, 'rb') as fh:
+        attrs = tgmdata.read_file(fh)
+
+    tgmdata.write_file(attrs, outfile)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert map files between "
+        "the binary (.%s) and compressed JSON formats"
+        % tgmdata.BINARY_FILE_SUFFIX)
+
+    parser.add_argument('infile', help="Map file to convert")
+    parser.add_argument('outfile', help="Converted map file to write. Binary "
+                        "format is used if the filename ends with .%s"
+                        % tgmdata.BINARY_FILE_SUFFIX)
+
+    args = parser.parse_args()
+    convert(args.infile, args.outfile)
+
+if __name__ == "__main__":
+    main()
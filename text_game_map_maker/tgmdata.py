@@ -1,8 +1,17 @@
+import os
+import re
+import json
+import zlib
+import codecs
+import shutil
+import tempfile
+
 from text_game_maker.player import player
 from text_game_maker.tile import tile
 from text_game_maker.game_objects import __object_model_version__ as obj_version
+from text_game_maker.game_objects.base import deserialize as deserialize_object
 
-from text_game_map_maker import saved_objects
+from text_game_map_maker import saved_objects, tgmbin
 
 
 VERSION = "1.0.2"
@@ -11,27 +20,71 @@ POSITIONS_KEY = "positions"
 ISLANDS_KEY = "islands"
 SAVED_OBJS_KEY = "saved_objects"
 
+# Suffixes for map files in the compressed JSON format, and the binary format
+JSON_FILE_SUFFIX = "tgmdata"
+BINARY_FILE_SUFFIX = "tgmbin"
+
+# Approx. number of bytes of JSON text to collect before passing it to the
+# compressor when writing a save file
+WRITE_CHUNK_SIZE = 64 * 1024
+
+# Number of tiles encoded per call to json.dumps when writing a save file
+ENCODE_BATCH_SIZE = 256
+
+# Permissions for newly created save files, same as open() would use. Read
+# once at import time, since the umask can only be read by changing it
+_umask = os.umask(0)
+os.umask(_umask)
+NEW_FILE_MODE = 0o666 & ~_umask
+
+# Number of bytes of compressed data to read at a time when loading a save file
+READ_CHUNK_SIZE = 64 * 1024
+
+# Max. number of tiles handed over at a time when loading a save file
+READ_BATCH_SIZE = 256
+
+_whitespace = re.compile(r'[ \t\n\r]*')
+
 
 class VersionMigration(object):
-    def __init__(self, from_version, to_version, migration_function):
+    """
+    Migrates map data from one version to the next. A migration may have a
+    function that migrates the map data as a whole, and/or a function that
+    migrates a single serialized tile. Whole-map functions must not touch tile
+    data; tile functions are fused with those of other migrations, and run in
+    a single pass over all tiles (see Migrator)
+    """
+    def __init__(self, from_version, to_version, migration_function=None,
+                 tile_migration_function=None):
         self.from_version = from_version
         self.to_version = to_version
         self._do_migration = migration_function
+        self._do_tile_migration = tile_migration_function
 
     def migrate(self, attrs):
+        if self._do_migration is None:
+            return attrs
+
         return self._do_migration(attrs)
 
+    def migrate_tile(self, tiledata):
+        if self._do_tile_migration is None:
+            return tiledata
+
+        return self._do_tile_migration(tiledata)
+
+    def has_tile_migration(self):
+        return self._do_tile_migration is not None
+
 def migrate_noversion_100(attrs):
     # Fix save files created before the 'islands' attribute was added
     attrs[ISLANDS_KEY] = []
     return attrs
 
-def migrate_100_101(attrs):
+def migrate_100_101(tiledata):
     # Fix save files created before we started setting 'original_name' on new tiles
-    for tiledata in attrs[player.TILES_KEY]:
-        tiledata["original_name"] = tiledata["name"]
-
-    return attrs
+    tiledata["original_name"] = tiledata["name"]
+    return tiledata
 
 def migrate_101_102(attrs):
     # Fix save files created before the 'saved_objects' attribute was created
@@ -40,36 +93,157 @@ def migrate_101_102(attrs):
 
 migrations = [
     VersionMigration(None, "1.0.0", migrate_noversion_100),
-    VersionMigration("1.0.0", "1.0.1", migrate_100_101),
+    VersionMigration("1.0.0", "1.0.1", tile_migration_function=migrate_100_101),
     VersionMigration("1.0.1", "1.0.2", migrate_101_102)
 ]
 
+# Migrations indexed by the version they migrate from
+_migrations_by_version = {m.from_version: m for m in migrations}
 
-def migrate_tgmdata_version(attrs):
-    curr_version = attrs[VERSION_KEY] if VERSION_KEY in attrs else None
 
-    for migration in migrations:
-        if migration.from_version == curr_version:
+def migration_path(version):
+    """
+    Get the migrations needed to bring map data from a given version up to the
+    current version
+
+    :param version: version of the map data, None if it has no version
+    :return: list of migrations to apply, in order. Empty if the map data is\
+        current, or newer than the current version
+    :rtype: list
+    """
+    path = []
+    while version in _migrations_by_version:
+        migration = _migrations_by_version[version]
+        path.append(migration)
+        version = migration.to_version
+
+    return path
+
+
+class Migrator(object):
+    """
+    Migrates map data from a given version to the current version. Migrations
+    of the map data as a whole and migrations of individual tiles are applied
+    separately, so that tiles can be migrated as they are read, and only the
+    tiles that are actually read are migrated
+    """
+    def __init__(self, version):
+        self.path = migration_path(version)
+        self.tile_migrations = [m for m in self.path if m.has_tile_migration()]
+
+    def migrate_attrs(self, attrs):
+        """
+        Apply all whole-map migrations, and set the current version
+
+        :param dict attrs: serialized map data
+        :return: migrated map data
+        :rtype: dict
+        """
+        for migration in self.path:
             attrs = migration.migrate(attrs)
-            curr_version = migration.to_version
+
+        if self.path:
+            attrs[VERSION_KEY] = self.path[-1].to_version
+
+        return attrs
+
+    def migrate_tiles(self, tile_list):
+        """
+        Apply all tile migrations to a list of serialized tiles, in a single
+        pass over the list. The list is modified in place
+
+        :param list tile_list: serialized tiles
+        :return: migrated tiles
+        :rtype: list
+        """
+        if not self.tile_migrations:
+            return tile_list
+
+        for i, tiledata in enumerate(tile_list):
+            for migration in self.tile_migrations:
+                tiledata = migration.migrate_tile(tiledata)
+
+            tile_list[i] = tiledata
+
+        return tile_list
+
+
+def migrate_tgmdata_version(attrs):
+    migrator = Migrator(attrs.get(VERSION_KEY, None))
+    attrs = migrator.migrate_attrs(attrs)
+
+    migrator.migrate_tiles(attrs[player.TILES_KEY])
+    for tile_list in attrs[ISLANDS_KEY]:
+        migrator.migrate_tiles(tile_list)
 
     return attrs
 
-def tile_id_in_map_data(tile_list, tile_id):
-    for tiledata in tile_list:
-        if tiledata["tile_id"] == tile_id:
-            return True
+def crawler(start, seen, cache=None):
+    """
+    Crawl over all tiles reachable from a start tile and serialize them. Same
+    output as text_game_maker.tile.tile.crawler, but the IDs of crawled tiles
+    are tracked in a set which is shared between calls, so that tiles which
+    have already been serialized by a previous crawl are skipped
+
+    :param text_game_maker.tile.tile.Tile start: tile to start crawling from
+    :param set seen: set of tile IDs already serialized. IDs of all tiles\
+        serialized by this crawl will be added to it
+    :param dict cache: serialized tiles keyed by tile object. Tiles found in\
+        the cache are not serialized again, and all other tiles crawled are\
+        added to it. Cached data must not be modified
+    :return: list of serialized tiles
+    :rtype: list
+    """
+    ret = []
+    tilestack = [start]
 
-    return False
+    while tilestack:
+        tileobj = tilestack.pop()
+        if tileobj.tile_id in seen:
+            continue
 
-def serialize(start_tile, tile_dict):
+        if cache is None:
+            ret.append(tileobj.get_attrs())
+        else:
+            tiledata = cache.get(tileobj, None)
+            if tiledata is None:
+                tiledata = tileobj.get_attrs()
+                cache[tileobj] = tiledata
+
+            ret.append(tiledata)
+
+        seen.add(tileobj.tile_id)
+
+        if isinstance(tileobj, tile.LockedDoor) and tileobj.replacement_tile:
+            tilestack.append(tileobj.replacement_tile)
+        else:
+            tilestack.extend(tileobj.iterate_directions())
+
+    return ret
+
+def serialize(start_tile, tile_dict, cache=None):
+    """
+    Serialize a map
+
+    :param text_game_maker.tile.tile.Tile start_tile: start tile
+    :param dict tile_dict: all tiles on the map, keyed by (y, x) grid position
+    :param dict cache: serialized tiles from an earlier call, keyed by tile\
+        object; see crawler
+    :return: serialized map data
+    :rtype: dict
+    """
+    # IDs of all tiles serialized so far, by the main crawl and all island crawls
+    seen = set()
+
+    # Small items and tile positions go first, ahead of the tile data, so that
+    # readers of the saved file can get to them without decoding any tiles
     attrs = {}
+    attrs[VERSION_KEY] = VERSION
     attrs[player.OBJECT_VERSION_KEY] = obj_version
-    attrs[player.TILES_KEY] = tile.crawler(start_tile)
     attrs[player.START_TILE_KEY] = start_tile.tile_id
-    attrs[VERSION_KEY] = VERSION
-    attrs[SAVED_OBJS_KEY] = saved_objects.get_objects()
     attrs[POSITIONS_KEY] = {}
+    attrs[SAVED_OBJS_KEY] = saved_objects.get_objects()
+    attrs[player.TILES_KEY] = crawler(start_tile, seen, cache)
     attrs[ISLANDS_KEY] = []
 
     for pos in tile_dict:
@@ -78,20 +252,155 @@ def serialize(start_tile, tile_dict):
         # Save tile position
         attrs[POSITIONS_KEY][tileobj.tile_id] = list(pos)
 
-        # If this tile wasn't caught by the crawler, then it's part of an island--
-        # Run the crawler again with this tile as the start tile
-        in_tile_map = tile_id_in_map_data(attrs[player.TILES_KEY], tileobj.tile_id)
-        in_islands = False
+        # If this tile wasn't caught by any crawl so far, then it's part of an
+        # island-- Run the crawler again with this tile as the start tile
+        if tileobj.tile_id not in seen:
+            attrs[ISLANDS_KEY].append(crawler(tileobj, seen, cache))
 
-        for tile_list in attrs[ISLANDS_KEY]:
-            if tile_id_in_map_data(tile_list, tileobj.tile_id):
-                in_islands = True
-                break
+    return attrs
 
-        if (not in_tile_map) and (not in_islands):
-            attrs[ISLANDS_KEY].append(tile.crawler(tileobj))
+def iterencode(value, depth=0):
+    """
+    Encode serialized map data as JSON, a piece at a time. Produces the same
+    text as json.dumps, but the top-level dict, the tile lists and the island
+    list are encoded a few items at a time, so the full JSON string is never
+    held in memory
 
-    return attrs
+    :param value: value to encode
+    :param int depth: nesting depth of value within the serialized map data
+    :return: generator yielding strings of JSON text
+    """
+    if isinstance(value, dict) and (depth == 0):
+        yield "{"
+        for i, key in enumerate(value):
+            yield "%s%s: " % (", " if i else "", json.dumps(str(key)))
+            yield from iterencode(value[key], depth + 1)
+
+        yield "}"
+    elif isinstance(value, list) and value and isinstance(value[0], list):
+        # List of islands
+        yield "["
+        for i, item in enumerate(value):
+            if i:
+                yield ", "
+
+            yield from iterencode(item, depth + 1)
+
+        yield "]"
+    elif isinstance(value, list):
+        # List of tiles, encode a batch of tiles per call to json.dumps
+        yield "["
+        for i in range(0, len(value), ENCODE_BATCH_SIZE):
+            if i:
+                yield ", "
+
+            # Strip the brackets from the encoded batch
+            yield json.dumps(value[i:i + ENCODE_BATCH_SIZE])[1:-1]
+
+        yield "]"
+    else:
+        yield json.dumps(value)
+
+def write_atomic(filename, write_function):
+    """
+    Write a file by writing a temporary file in the same directory, which is
+    then renamed to the target filename; an existing file is never left
+    partially written
+
+    :param str filename: name of file to write
+    :param write_function: function that writes the file contents, called\
+        with a file object opened for writing in binary mode
+    """
+    dirname = os.path.dirname(os.path.abspath(filename))
+    fd, tempname = tempfile.mkstemp(dir=dirname, prefix=".tgmdata-",
+                                    suffix=".tmp")
+
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            write_function(fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+        if os.path.exists(filename):
+            shutil.copymode(filename, tempname)
+        else:
+            os.chmod(tempname, NEW_FILE_MODE)
+
+        os.replace(tempname, filename)
+    except BaseException:
+        if os.path.exists(tempname):
+            os.remove(tempname)
+
+        raise
+
+def write_compressed(attrs, filename, chunk_size=WRITE_CHUNK_SIZE):
+    """
+    Write serialized map data to a file as zlib-compressed JSON. The JSON text
+    is encoded and compressed in chunks, and the file is written with
+    write_atomic
+
+    :param dict attrs: serialized map data, as returned by serialize()
+    :param str filename: name of file to write
+    :param int chunk_size: approx. number of bytes of JSON text to pass to the\
+        compressor at a time
+    """
+    def _write(fh):
+        compressor = zlib.compressobj()
+        pending = []
+        pending_size = 0
+
+        for text in iterencode(attrs):
+            pending.append(text)
+            pending_size += len(text)
+
+            if pending_size >= chunk_size:
+                fh.write(compressor.compress("".join(pending).encode("utf-8")))
+                pending = []
+                pending_size = 0
+
+        fh.write(compressor.compress("".join(pending).encode("utf-8")))
+        fh.write(compressor.flush())
+
+    write_atomic(filename, _write)
+
+def write_binary(attrs, filename):
+    """
+    Write serialized map data to a file in the binary format (see tgmbin).
+    The file is written with write_atomic
+
+    :param dict attrs: serialized map data, as returned by serialize()
+    :param str filename: name of file to write
+    """
+    data = tgmbin.encode(attrs)
+    write_atomic(filename, lambda fh: fh.write(data))
+
+def write_file(attrs, filename):
+    """
+    Write serialized map data to a file. Files with the binary file suffix are
+    written in the binary format, all others as compressed JSON
+
+    :param dict attrs: serialized map data, as returned by serialize()
+    :param str filename: name of file to write
+    """
+    if filename.endswith("." + BINARY_FILE_SUFFIX):
+        write_binary(attrs, filename)
+    else:
+        write_compressed(attrs, filename)
+
+def read_file(fh):
+    """
+    Read serialized map data from a file in either format. The file is read
+    in full; see MapLoader for loading large files incrementally
+
+    :param fh: file object opened for reading in binary mode
+    :return: serialized map data, not yet migrated
+    :rtype: dict
+    """
+    data = fh.read()
+    if tgmbin.is_binary(data):
+        return tgmbin.decode(data)
+
+    return json.loads(zlib.decompress(data).decode("utf-8"))
 
 def deserialize(attrs):
     attrs = migrate_tgmdata_version(attrs)
@@ -109,3 +418,314 @@ def deserialize(attrs):
 
     saved_objects.set_objects(attrs[SAVED_OBJS_KEY])
     return start_tile
+
+
+class TileBatch(object):
+    """
+    A batch of serialized tiles read from a save file
+    """
+    def __init__(self, key, island, tiles):
+        # Key of the tile list in the map data, player.TILES_KEY or ISLANDS_KEY
+        self.key = key
+
+        # Index of the island these tiles belong to, or None for the main tile
+        # list
+        self.island = island
+        self.tiles = tiles
+
+
+class MapDataReader(object):
+    """
+    Reads map data from a compressed save file incrementally. Compressed data
+    is read and decompressed a chunk at a time, and tile lists are parsed one
+    tile at a time, so neither the full decompressed text nor the full list of
+    serialized tiles is ever held in memory
+    """
+    def __init__(self, fh, chunk_size=READ_CHUNK_SIZE):
+        self.fh = fh
+        self.chunk_size = chunk_size
+
+        # Number of bytes of compressed data read from the file so far
+        self.bytes_read = 0
+
+        self._decompressor = zlib.decompressobj()
+        self._textdecoder = codecs.getincrementaldecoder("utf-8")()
+        self._jsondecoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _read(self):
+        data = self.fh.read(self.chunk_size)
+        self.bytes_read += len(data)
+
+        if data:
+            text = self._textdecoder.decode(self._decompressor.decompress(data))
+        elif not self._decompressor.eof:
+            raise ValueError("Compressed map data is truncated")
+        else:
+            self._eof = True
+            text = self._textdecoder.decode(self._decompressor.flush(), final=True)
+
+        # Drop the text that has already been parsed
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+
+    def _skip_whitespace(self):
+        while True:
+            self._pos = _whitespace.match(self._buf, self._pos).end()
+            if (self._pos < len(self._buf)) or self._eof:
+                return
+
+            self._read()
+
+    def _peek(self):
+        self._skip_whitespace()
+        return self._buf[self._pos:self._pos + 1]
+
+    def _expect(self, chars):
+        char = self._peek()
+        if (not char) or (char not in chars):
+            raise ValueError("Malformed map data: expected one of '%s', got '%s'"
+                             % (chars, char))
+
+        self._pos += 1
+        return char
+
+    def _value(self):
+        self._skip_whitespace()
+
+        while True:
+            try:
+                value, end = self._jsondecoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            else:
+                # A value that runs right up to the end of the buffer may be
+                # truncated (e.g. a number), unless there's no more data
+                if (end < len(self._buf)) or self._eof:
+                    self._pos = end
+                    return value
+
+            # Value is incomplete; read until the unparsed text has doubled in
+            # size before trying again, so large values aren't re-parsed once
+            # per chunk
+            target = 2 * (len(self._buf) - self._pos)
+            while (not self._eof) and ((len(self._buf) - self._pos) < target):
+                self._read()
+
+    def _list(self, batch_size):
+        # Yields lists of up to batch_size items from a JSON list
+        self._expect("[")
+        batch = []
+
+        if self._peek() == "]":
+            self._pos += 1
+            return
+
+        while True:
+            batch.append(self._value())
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+            if self._expect(",]") == "]":
+                break
+
+        if batch:
+            yield batch
+
+    def items(self, batch_size=READ_BATCH_SIZE):
+        """
+        Generator yielding all top-level items in the map data, in the order
+        they appear in the file, as (key, value) tuples. Tile lists are yielded
+        as multiple TileBatch values holding up to batch_size serialized tiles
+
+        :param int batch_size: max. number of tiles per TileBatch
+        """
+        self._expect("{")
+        if self._peek() == "}":
+            return
+
+        while True:
+            key = self._value()
+            self._expect(":")
+
+            if key == player.TILES_KEY:
+                for tiles in self._list(batch_size):
+                    yield key, TileBatch(key, None, tiles)
+            elif key == ISLANDS_KEY:
+                self._expect("[")
+                island = 0
+
+                while self._peek() not in ("]", ""):
+                    for tiles in self._list(batch_size):
+                        yield key, TileBatch(key, island, tiles)
+
+                    island += 1
+                    if self._peek() == ",":
+                        self._pos += 1
+
+                self._expect("]")
+            else:
+                yield key, self._value()
+
+            if self._expect(",}") == "}":
+                return
+
+
+def link_tiles(tiles):
+    """
+    Replace the tile IDs in the links between deserialized tiles with the
+    tile objects they refer to
+
+    :param dict tiles: all tiles in the map, keyed by tile ID
+    """
+    for tileobj in tiles.values():
+        if isinstance(tileobj, tile.LockedDoor) and tileobj.replacement_tile:
+            tileobj.replacement_tile = tiles[tileobj.replacement_tile]
+            if tileobj.source_tile:
+                tileobj.source_tile = tiles[tileobj.source_tile]
+        else:
+            for direction in ['north', 'south', 'east', 'west']:
+                tile_id = getattr(tileobj, direction)
+                if tile_id:
+                    setattr(tileobj, direction, tiles[tile_id])
+
+
+class DecodedMapReader(object):
+    """
+    Provides the same interface as MapDataReader, for map data which has
+    already been decoded in full (e.g. from a binary map file)
+    """
+    def __init__(self, attrs, size):
+        self.attrs = attrs
+        self.bytes_read = size
+
+    def items(self, batch_size=READ_BATCH_SIZE):
+        """
+        Generator yielding all top-level items in the map data, in the same
+        form as MapDataReader.items
+
+        :param int batch_size: max. number of tiles per TileBatch
+        """
+        for key, value in self.attrs.items():
+            if key == player.TILES_KEY:
+                for i in range(0, len(value), batch_size):
+                    yield key, TileBatch(key, None, value[i:i + batch_size])
+            elif key == ISLANDS_KEY:
+                for island, tiles in enumerate(value):
+                    for i in range(0, len(tiles), batch_size):
+                        yield key, TileBatch(key, island, tiles[i:i + batch_size])
+            else:
+                yield key, value
+
+
+class MapLoader(object):
+    """
+    Loads map data from a save file in either format, building tiles a batch
+    at a time as they are read from the file. Tiles are not linked to each
+    other until the whole file has been read. Binary map files are decoded in
+    full before the first batch is built.
+
+    Save files written by this version of the map editor hold the version,
+    start tile and tile positions ahead of the tile lists, so all are available
+    before the first batch of tiles is built, and each batch of tiles is
+    migrated just before it is built. Older save files are read in full, and
+    migrated and deserialized in one go
+    """
+    def __init__(self, fh, batch_size=READ_BATCH_SIZE):
+        magic = fh.read(len(tgmbin.MAGIC))
+        fh.seek(0)
+
+        if tgmbin.is_binary(magic):
+            data = fh.read()
+            self.reader = DecodedMapReader(tgmbin.decode(data), len(data))
+        else:
+            self.reader = MapDataReader(fh)
+
+        self.batch_size = batch_size
+
+        # Tile positions and start tile ID, available as soon as they have been
+        # read from the file
+        self.positions = None
+        self.start_tile_id = None
+
+        # Start tile of the loaded map, available once all batches are built
+        self.start_tile = None
+
+    @property
+    def bytes_read(self):
+        return self.reader.bytes_read
+
+    def batches(self):
+        """
+        Generator yielding lists of newly built tiles. Old tiles are discarded
+        before the first batch is built. Once the generator is exhausted, all
+        tiles are linked, saved objects are loaded, and self.start_tile is set
+        """
+        attrs = {}
+        tiles = {}
+        streaming = None
+        migrator = None
+
+        tile._tiles.clear()
+
+        for key, value in self.reader.items(self.batch_size):
+            if not isinstance(value, TileBatch):
+                attrs[key] = value
+                if key == POSITIONS_KEY:
+                    self.positions = value
+                elif key == player.START_TILE_KEY:
+                    self.start_tile_id = value
+
+                continue
+
+            if streaming is None:
+                # Tiles can be built as they arrive only if the version of the
+                # map data, the start tile and positions are known
+                streaming = ((VERSION_KEY in attrs) and
+                             (self.positions is not None) and
+                             (self.start_tile_id is not None))
+
+                if streaming:
+                    migrator = Migrator(attrs[VERSION_KEY])
+                    attrs = migrator.migrate_attrs(attrs)
+                    self.positions = attrs[POSITIONS_KEY]
+                    self.start_tile_id = attrs[player.START_TILE_KEY]
+
+            if streaming:
+                version = attrs[player.OBJECT_VERSION_KEY]
+                migrator.migrate_tiles(value.tiles)
+                batch = [deserialize_object(d, version) for d in value.tiles]
+                for tileobj in batch:
+                    tiles[tileobj.tile_id] = tileobj
+
+                yield batch
+            elif value.island is None:
+                attrs.setdefault(key, []).extend(value.tiles)
+            else:
+                islands = attrs.setdefault(key, [])
+                while len(islands) <= value.island:
+                    islands.append([])
+
+                islands[value.island].extend(value.tiles)
+
+        if not streaming:
+            # An empty island list produces no batches
+            attrs.setdefault(ISLANDS_KEY, [])
+
+            self.start_tile = deserialize(attrs)
+            self.positions = attrs[POSITIONS_KEY]
+            self.start_tile_id = self.start_tile.tile_id
+
+            yield list(tile._tiles.values())
+            return
+
+        if self.start_tile_id not in tiles:
+            raise RuntimeError("No tile found with ID '%s'" % self.start_tile_id)
+
+        link_tiles(tiles)
+        saved_objects.set_objects(attrs[SAVED_OBJS_KEY])
+        self.start_tile = tiles[self.start_tile_id]
@@ -1,4 +1,4 @@
-from PyQt5 import QtWidgets, QtCore, QtGui
+from PyQt5 import QtCore, QtGui
 
 from text_game_maker.tile import tile
 
@@ -6,6 +6,7 @@ door_colour = QtCore.Qt.black
 wall_colour = QtCore.Qt.black
 selected_wall_colour = QtCore.Qt.red
 keypad_door_colour = QtCore.Qt.blue
+text_colour = QtCore.Qt.black
 
 tile_border_pixels = 4
 mask_tile_colour = '#858585'
@@ -13,8 +14,32 @@ start_tile_colour = '#6bfa75'
 tile_border_colour = '#000000'
 selected_border_colour = '#ff0000'
 
-button_style = "border:4px solid %s; background-color: None" % tile_border_colour
-start_button_style = "border:4px solid %s; background-color: %s" % (tile_border_colour, start_tile_colour)
+
+_pen_cache = {}
+_colour_cache = {}
+_style_cache = {}
+
+
+def cached_pen(colour, width):
+    """
+    Returns a QPen for the given colour and width, re-using a previously
+    created pen if one exists
+    """
+    key = (colour, width)
+    if key not in _pen_cache:
+        _pen_cache[key] = QtGui.QPen(QtGui.QColor(colour), width)
+
+    return _pen_cache[key]
+
+def cached_colour(colour):
+    """
+    Returns a QColor for the given colour name, re-using a previously created
+    QColor if one exists
+    """
+    if colour not in _colour_cache:
+        _colour_cache[colour] = QtGui.QColor(colour)
+
+    return _colour_cache[colour]
 
 
 class BorderType(object):
@@ -23,24 +48,77 @@ class BorderType(object):
     EMPTY = 2
 
 
-class TileButton(QtWidgets.QPushButton):
-    # Will be set by calculate_dimensions
+class CellStyle(object):
+    """
+    Background colour and border type of a cell, worked out from the state of
+    the cell. Instances are shared between cells and are never modified; use
+    cell_style to get one
+    """
+    def __init__(self, selected, start, selection_mask, filled):
+        self.selected = selected
+        self.start = start
+        self.selection_mask = selection_mask
+        self.filled = filled
+
+        if selection_mask:
+            self.background = mask_tile_colour
+        elif start:
+            self.background = start_tile_colour
+        else:
+            self.background = None
+
+        self.background_colour = None
+        if self.background is not None:
+            self.background_colour = cached_colour(self.background)
+
+        if selected:
+            self.border_type = BorderType.SELECTED
+        elif filled:
+            self.border_type = BorderType.FILLED
+        else:
+            self.border_type = BorderType.EMPTY
+
+
+def cell_style(selected=False, start=False, selection_mask=False, filled=False):
+    """
+    Returns the CellStyle for the given cell state, re-using a previously
+    created CellStyle if one exists
+    """
+    key = (selected, start, selection_mask, filled)
+    if key not in _style_cache:
+        _style_cache[key] = CellStyle(*key)
+
+    return _style_cache[key]
+
+
+class TileButton(object):
+    """
+    Holds the drawing state of a single cell in the tile grid. This is not a
+    widget; TileButton instances are created on demand by TileGrid, which is
+    responsible for painting them
+    """
+
+    # Will be set by set_dimensions
     doorwidth = 0
     borderwidth = 0
     border_lines = []
     walls_map = {}
     doors_map = {}
+    wall_pen = None
+    selected_pen = None
+    door_pen = None
+    keypad_door_pen = None
 
-    # When the cursor is hovering over a tile button, this will contain the
-    # button object, otherwise None.
-    hovering = None
+    def __init__(self, grid, main, position):
+        self.grid = grid
+        self.main = main
 
-    def __init__(self, parent=None):
-        super(TileButton, self).__init__(parent)
+        # (y, x) position of this button on the grid. Never changes once set
+        self.position = position
         self.doors = []
         self.keypad_doors = []
-        self.main = parent
-        self.border_type = BorderType.EMPTY
+        self.style = cell_style()
+        self._text = ""
 
     @classmethod
     def set_dimensions(cls, width, height):
@@ -56,76 +134,69 @@ class TileButton(QtWidgets.QPushButton):
         cls.borderwidth = max(2, width / 16)
 
         cls.border_lines = [
-            (0, width, 0, 0),
-            (height, width, height, 0),
-            (height, 0, 0, 0),
-            (height, width, 0, width)
+            QtCore.QLineF(0, width, 0, 0),
+            QtCore.QLineF(height, width, height, 0),
+            QtCore.QLineF(height, 0, 0, 0),
+            QtCore.QLineF(height, width, 0, width)
         ]
 
         cls.walls_map = {
-            "north": (0, 0, height, 0),
-            "south": (0, width, height, width),
-            "east": (height, 0, height, width),
-            "west": (0, 0, 0, width)
+            "north": QtCore.QLineF(0, 0, height, 0),
+            "south": QtCore.QLineF(0, width, height, width),
+            "east": QtCore.QLineF(height, 0, height, width),
+            "west": QtCore.QLineF(0, 0, 0, width)
         }
 
         cls.doors_map = {
-            "north": (adjusted_qheight, 0, height - adjusted_qheight, 0),
-            "south": (adjusted_qheight, width, height - adjusted_qheight, width),
-            "east": (height, adjusted_qwidth, height, width - adjusted_qwidth),
-            "west": (0, adjusted_qwidth, 0, width - adjusted_qwidth)
+            "north": QtCore.QLineF(adjusted_qheight, 0, height - adjusted_qheight, 0),
+            "south": QtCore.QLineF(adjusted_qheight, width, height - adjusted_qheight, width),
+            "east": QtCore.QLineF(height, adjusted_qwidth, height, width - adjusted_qwidth),
+            "west": QtCore.QLineF(0, adjusted_qwidth, 0, width - adjusted_qwidth)
         }
 
-    def leaveEvent(self, event):
-        self.__class__.hovering = None
-
-    def enterEvent(self, event):
-        self.__class__.hovering = self
-
-        if self.main.tracking_tile_button_enter:
-            self.main.onTileButtonEnter(self)
+        # Pens from the previous zoom level will not be used again
+        _pen_cache.clear()
 
-    def setStyle(self, selected=False, start=False, selection_mask=False):
-        if selection_mask:
-            colour = "background-color: %s" % mask_tile_colour
-            self.setStyleSheet(colour)
-        else:
-            border = ""
-            bordercolour = selected_wall_colour if selected else wall_colour
+        cls.wall_pen = cached_pen(wall_colour, cls.borderwidth)
+        cls.selected_pen = cached_pen(selected_wall_colour, cls.borderwidth)
+        cls.door_pen = cached_pen(door_colour, cls.doorwidth)
+        cls.keypad_door_pen = cached_pen(keypad_door_colour, cls.doorwidth)
 
-            if start:
-                colour = "background-color: %s" % start_tile_colour
-            else:
-                colour = "background-color: None"
+    @property
+    def background(self):
+        return self.style.background
 
-            self.setStyleSheet(colour)
+    @property
+    def border_type(self):
+        return self.style.border_type
 
-            pos = self.main.getButtonPosition(self)
-            tileobj = self.main.tileAtPosition(*pos)
+    def text(self):
+        return self._text
 
-            if selected:
-                self.border_type = BorderType.SELECTED
-            elif tileobj is None:
-                self.border_type = BorderType.EMPTY
-            else:
-                self.border_type = BorderType.FILLED
+    def setText(self, text):
+        if text == self._text:
+            return
 
+        self._text = text
         self.update()
 
-    def eventFilter(self, obj, event):
-        if event.type() == QtCore.QEvent.MouseButtonPress:
-            if event.button() == QtCore.Qt.LeftButton:
-                self.main.onLeftClick(obj)
-            elif event.button() == QtCore.Qt.RightButton:
-                self.main.onRightClick(obj)
-            elif event.button() == QtCore.Qt.MiddleButton:
-                self.main.onMiddleClick(obj)
+    def update(self):
+        self.grid.updateCell(self.position)
 
-        elif event.type() == QtCore.QEvent.KeyPress:
-            if event.key() in [QtCore.Qt.Key_Enter, QtCore.Qt.Key_Return]:
-                self.main.onLeftClick(obj)
+    def setStyle(self, selected=False, start=False, selection_mask=False):
+        if selection_mask:
+            # Selection mask covers the background, and leaves the border as-is
+            old = self.style
+            style = cell_style(old.selected, old.start, True, old.filled)
+        else:
+            filled = self.main.tileAtPosition(*self.position) is not None
+            style = cell_style(selected, start, False, filled)
 
-        return QtCore.QObject.event(obj, event)
+        # Cells are often re-styled with the style they already have, e.g.
+        # when a selection mask is redrawn one cell away from where it was
+        if style is not self.style:
+            self.style = style
+            self.update()
 
     def clearDoors(self):
         self.doors = []
@@ -144,45 +215,63 @@ class TileButton(QtWidgets.QPushButton):
         self.doors.extend(doors)
         self.keypad_doors.extend(keypad_doors)
 
-    def paintEvent(self, event):
-        super(TileButton, self).paintEvent(event)
+    def paint(self, painter):
+        """
+        Draw this cell. The painter is expected to be translated so that the
+        top-left corner of the cell is at (0, 0)
+        """
+        size = self.grid.cell_size
+
+        if self.style.background_colour is not None:
+            painter.fillRect(0, 0, size, size, self.style.background_colour)
+
+        if self._text:
+            painter.setPen(cached_pen(text_colour, 1))
+            painter.drawText(0, 0, size, size, QtCore.Qt.AlignCenter, self._text)
 
-        for direction in self.doors:
-            self.drawDoor(door_colour, direction)
+        if self.doors:
+            self.drawDoors(painter, self.door_pen, self.doors)
 
-        for direction in self.keypad_doors:
-            self.drawDoor(keypad_door_colour, direction)
+        if self.keypad_doors:
+            self.drawDoors(painter, self.keypad_door_pen, self.keypad_doors)
 
-        if self.border_type == BorderType.SELECTED:
-            self.drawBorder(selected_wall_colour)
-        elif self.border_type == BorderType.FILLED:
-            self.drawWalls()
+        if self.style.border_type == BorderType.SELECTED:
+            self.drawBorder(painter, self.selected_pen)
+        elif self.style.border_type == BorderType.FILLED:
+            self.drawWalls(painter)
 
-    def drawBorder(self, colour):
-        for points in self.border_lines:
-            self.drawLine(colour, self.borderwidth, *points)
+    def drawBorder(self, painter, pen):
+        painter.setPen(pen)
+        painter.drawLines(self.border_lines)
 
-    def drawWalls(self):
-        pos = self.main.getButtonPosition(self)
-        tileobj = self.main.tileAtPosition(*pos)
+    def drawWalls(self, painter):
+        tileobj = self.main.tileAtPosition(*self.position)
+        lines = []
 
         for direction in self.walls_map:
             adjacent = None
             if tileobj is not None:
                 adjacent = getattr(tileobj, direction)
 
-            if (adjacent is None) or adjacent.is_door():
-                self.drawLine(wall_colour, self.borderwidth, *self.walls_map[direction])
+            # While a map is being loaded, adjacent tiles may still be tile IDs
+            if isinstance(adjacent, tile.Tile) and (not adjacent.is_door()):
+                continue
 
-    def drawDoor(self, colour, direction):
-        points = self.doors_map[direction]
-        self.drawLine(colour, self.doorwidth, *points)
+            if (adjacent is None) or isinstance(adjacent, tile.Tile):
+                lines.append(self.walls_map[direction])
+
+        if lines:
+            painter.setPen(self.wall_pen)
+            painter.drawLines(lines)
+
+    def drawDoors(self, painter, pen, directions):
+        painter.setPen(pen)
+        painter.drawLines([self.doors_map[d] for d in directions])
 
     def redrawDoors(self):
         doors = []
         keypad_doors = []
-        pos = self.main.getButtonPosition(self)
-        tileobj = self.main.tileAtPosition(*pos)
+        tileobj = self.main.tileAtPosition(*self.position)
 
         if tileobj is not None:
             for direction in ['north', 'south', 'east', 'west']:
@@ -192,13 +281,9 @@ class TileButton(QtWidgets.QPushButton):
                 elif type(attr) == tile.LockedDoorWithKeypad:
                     keypad_doors.append(direction)
 
-        self.clearDoors()
-        self.addDoors(doors, keypad_doors)
-        self.update()
+        if (doors == self.doors) and (keypad_doors == self.keypad_doors):
+            return
 
-    def drawLine(self, colour, width, x1, y1, x2, y2):
-        painter = QtGui.QPainter(self)
-        painter.setPen(QtGui.QPen(colour, width))
-        brush = QtGui.QBrush()
-        painter.setBrush(brush)
-        painter.drawLine(QtCore.QLine(x1, y1, x2, y2))
+        self.doors = doors
+        self.keypad_doors = keypad_doors
+        self.update()
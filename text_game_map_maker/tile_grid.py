@@ -0,0 +1,298 @@
+import time
+
+from PyQt5 import QtWidgets, QtCore, QtGui
+
+from text_game_map_maker.tile_button import TileButton
+
+
+class PaintCounter(object):
+    """
+    Counts paint events handled by the tile grid, and the time spent in them.
+    Useful for measuring frame times while zooming or auto-scrolling
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.cells = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.last_time = 0.0
+
+    def add(self, elapsed, cells):
+        self.frames += 1
+        self.cells += cells
+        self.total_time += elapsed
+        self.last_time = elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+    def average_time(self):
+        if self.frames == 0:
+            return 0.0
+
+        return self.total_time / self.frames
+
+    def __str__(self):
+        return ("%d frames, %d cells, avg. %.2fms, max. %.2fms"
+                % (self.frames, self.cells, self.average_time() * 1000.0,
+                   self.max_time * 1000.0))
+
+
+class TileGrid(QtWidgets.QWidget):
+    """
+    Single widget that draws the whole tile grid. Nothing is created up-front
+    for each cell; TileButton instances are only created for cells that are
+    accessed through buttonAtPosition, and only cells intersecting the region
+    being repainted are drawn, so the cost of creating and painting the grid
+    does not depend on the number of rows and columns.
+    """
+
+    def __init__(self, main, rows, columns, cell_size, spacing=2, margin=10):
+        super(TileGrid, self).__init__()
+
+        self.main = main
+        self.rows = rows
+        self.columns = columns
+        self.cell_size = cell_size
+        self.spacing = spacing
+        self.margin = margin
+
+        # Maps (y, x) positions to TileButton instances, for cells that have
+        # been accessed at least once. Each TileButton also holds its own
+        # position, so lookups in both directions are constant-time
+        self.buttons = {}
+
+        # Positions of cells that have changed since the grid was last
+        # repainted. All cells that change within one pass of the event loop
+        # are repainted together, by a single update when the loop is next idle
+        self.pending_updates = set()
+        self.updateTimer = QtCore.QTimer(self)
+        self.updateTimer.setSingleShot(True)
+        self.updateTimer.setInterval(0)
+        self.updateTimer.timeout.connect(self.flushUpdates)
+
+        # Position of the cell currently under the cursor, if any
+        self.hover_position = None
+
+        self.font = QtGui.QFont()
+        self.font.setFamily("Arial")
+
+        self.paint_counter = PaintCounter()
+
+        # Scale factor applied to the rendered grid, to preview a new zoom
+        # level without re-laying out the grid. Reset by setCellSize.
+        self.preview_scale = 1.0
+        self.preview_anchor = QtCore.QPointF(0, 0)
+
+        self.setFocusPolicy(QtCore.Qt.StrongFocus)
+        self.setMouseTracking(True)
+        self.updateGeometry()
+
+    def updateGeometry(self):
+        step = self.cell_size + self.spacing
+        width = (self.margin * 2) + (self.columns * step) - self.spacing
+        height = (self.margin * 2) + (self.rows * step) - self.spacing
+        self.setFixedSize(width, height)
+
+    def setGridSize(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+
+        # Drop any buttons that are no longer on the grid
+        for pos in list(self.buttons.keys()):
+            if (pos[0] >= rows) or (pos[1] >= columns):
+                del self.buttons[pos]
+
+        if self.hover_position not in self.buttons:
+            self.setHovering(None)
+
+        self.updateGeometry()
+        self.update()
+
+    def setPreviewScale(self, scale, anchor=None):
+        """
+        Draw the grid scaled by the given factor around an anchor point, without
+        changing the size of the grid or its cells
+        """
+        self.preview_scale = scale
+        if anchor is not None:
+            self.preview_anchor = QtCore.QPointF(anchor)
+
+        self.update()
+
+    def setCellSize(self, cell_size, font_size):
+        self.preview_scale = 1.0
+        self.cell_size = cell_size
+        self.font.setPointSizeF(font_size)
+        self.updateGeometry()
+        self.update()
+
+    def buttonAtPosition(self, y, x):
+        if (y < 0) or (y >= self.rows) or (x < 0) or (x >= self.columns):
+            return None
+
+        pos = (y, x)
+        if pos not in self.buttons:
+            self.buttons[pos] = TileButton(self, self.main, pos)
+
+        return self.buttons[pos]
+
+    def cellRect(self, y, x):
+        step = self.cell_size + self.spacing
+        return QtCore.QRect(self.margin + (x * step), self.margin + (y * step),
+                            self.cell_size, self.cell_size)
+
+    def positionAt(self, point):
+        """
+        Returns the (y, x) position of the cell under the given point, or None
+        if the point is not over a cell
+        """
+        step = self.cell_size + self.spacing
+        px = point.x() - self.margin
+        py = point.y() - self.margin
+
+        if (px < 0) or (py < 0):
+            return None
+
+        y, yoff = divmod(py, step)
+        x, xoff = divmod(px, step)
+
+        if (y >= self.rows) or (x >= self.columns):
+            return None
+
+        if (yoff >= self.cell_size) or (xoff >= self.cell_size):
+            # Point is in the gap between two cells
+            return None
+
+        return int(y), int(x)
+
+    def updateCell(self, pos):
+        """
+        Schedule a cell to be repainted
+        """
+        self.pending_updates.add(pos)
+        if not self.updateTimer.isActive():
+            self.updateTimer.start()
+
+    def flushUpdates(self):
+        """
+        Repaint the smallest rectangle containing all cells scheduled for
+        repainting, with a single update
+        """
+        self.updateTimer.stop()
+        positions = self.pending_updates
+        if not positions:
+            return
+
+        self.pending_updates = set()
+
+        ys = [pos[0] for pos in positions]
+        xs = [pos[1] for pos in positions]
+        rect = self.cellRect(min(ys), min(xs)).united(self.cellRect(max(ys), max(xs)))
+        self.update(rect)
+
+    def paintEvent(self, event):
+        start_time = time.perf_counter()
+        painter = QtGui.QPainter(self)
+        rect = event.rect()
+
+        if self.preview_scale != 1.0:
+            painter.fillRect(rect, self.palette().window())
+
+            transform = QtGui.QTransform()
+            transform.translate(self.preview_anchor.x(), self.preview_anchor.y())
+            transform.scale(self.preview_scale, self.preview_scale)
+            transform.translate(-self.preview_anchor.x(), -self.preview_anchor.y())
+            painter.setTransform(transform)
+
+            # Work out which cells are exposed in unscaled grid coordinates
+            rect = transform.inverted()[0].mapRect(rect)
+
+        step = self.cell_size + self.spacing
+
+        first_y = max(0, (rect.top() - self.margin) // step)
+        first_x = max(0, (rect.left() - self.margin) // step)
+        last_y = min(self.rows - 1, (rect.bottom() - self.margin) // step)
+        last_x = min(self.columns - 1, (rect.right() - self.margin) // step)
+
+        painter.setFont(self.font)
+
+        # Draw all empty cells in the exposed region with a single call
+        cells = [self.cellRect(y, x).adjusted(0, 0, -1, -1)
+                 for y in range(first_y, last_y + 1)
+                 for x in range(first_x, last_x + 1)]
+
+        painter.setPen(QtGui.QPen(self.palette().mid().color(), 1))
+        painter.setBrush(self.palette().button())
+        painter.drawRects(cells)
+        painter.setBrush(QtCore.Qt.NoBrush)
+
+        # Draw any cells that have buttons on top
+        for y in range(first_y, last_y + 1):
+            for x in range(first_x, last_x + 1):
+                button = self.buttons.get((y, x), None)
+                if button is None:
+                    continue
+
+                cell = self.cellRect(y, x)
+                painter.save()
+                painter.translate(cell.topLeft())
+                painter.setClipRect(0, 0, self.cell_size, self.cell_size)
+                button.paint(painter)
+                painter.restore()
+
+        painter.end()
+        self.paint_counter.add(time.perf_counter() - start_time, len(cells))
+
+    def setHovering(self, pos):
+        if pos == self.hover_position:
+            return
+
+        self.hover_position = pos
+        if (pos is not None) and self.main.tracking_tile_button_enter:
+            self.main.onTileButtonEnter(self.buttonAtPosition(*pos))
+
+    def updateHovering(self):
+        """
+        Work out which cell is under the cursor from the current cursor
+        position. Needed when the grid moves under a cursor that is not moving,
+        e.g. when auto-scrolling
+        """
+        point = self.mapFromGlobal(QtGui.QCursor.pos())
+        if not self.rect().contains(point):
+            self.setHovering(None)
+            return
+
+        self.setHovering(self.positionAt(point))
+
+    def mouseMoveEvent(self, event):
+        self.setHovering(self.positionAt(event.pos()))
+
+        # Let the scrollarea viewport see mouse movement too, for auto-scrolling
+        event.ignore()
+
+    def leaveEvent(self, event):
+        self.setHovering(None)
+
+    def mousePressEvent(self, event):
+        pos = self.positionAt(event.pos())
+        if pos is None:
+            return
+
+        button = self.buttonAtPosition(*pos)
+
+        if event.button() == QtCore.Qt.LeftButton:
+            self.main.onLeftClick(button)
+        elif event.button() == QtCore.Qt.RightButton:
+            self.main.onRightClick(button)
+        elif event.button() == QtCore.Qt.MiddleButton:
+            self.main.onMiddleClick(button)
+
+    def keyPressEvent(self, event):
+        if event.key() in [QtCore.Qt.Key_Enter, QtCore.Qt.Key_Return]:
+            if self.main.selectedPosition is not None:
+                self.main.onLeftClick(self.buttonAtPosition(*self.main.selectedPosition))
+                return
+
+        super(TileGrid, self).keyPressEvent(event)
@@ -0,0 +1,96 @@
+import collections
+
+
+# (y, x) offsets for moving one tile in each direction
+MOVE_MAP = {
+    'north': (-1, 0),
+    'south': (1, 0),
+    'east': (0, 1),
+    'west': (0, -1)
+}
+
+
+class PositionConflict(object):
+    """
+    Describes a tile that could not be placed, because its position is
+    already occupied by another tile
+    """
+    def __init__(self, tile_id, position, occupied_by):
+        self.tile_id = tile_id
+        self.position = position
+        self.occupied_by = occupied_by
+
+    def __str__(self):
+        return ("tile '%s' at position %s conflicts with tile '%s'"
+                % (self.tile_id, self.position, self.occupied_by))
+
+
+def get_tile_positions(start_tile, origin=(0, 0)):
+    """
+    Walk all tiles reachable from a start tile (breadth-first), and work out
+    the grid position of each tile from the directions used to reach it.
+    Doors are walked through to the tile on the other side. Each tile is
+    visited exactly once.
+
+    If a tile ends up at a position that is already occupied by a different
+    tile, the tile is not placed, and the conflict is reported instead.
+
+    :param text_game_maker.tile.tile.Tile start_tile: tile to start from
+    :param tuple origin: position of the start tile, as (y, x)
+    :return: tuple of the form (positions, conflicts), where positions is a\
+        dict mapping tile IDs to (y, x) tuples, and conflicts is a list of\
+        PositionConflict instances
+    :rtype: tuple
+    """
+    positions = {start_tile.tile_id: origin}
+    occupied = {origin: start_tile.tile_id}
+    conflicts = []
+    seen = set([start_tile.tile_id])
+    queue = collections.deque([(start_tile, origin)])
+
+    while queue:
+        curr, pos = queue.popleft()
+
+        for direction, (yinc, xinc) in MOVE_MAP.items():
+            neighbour = getattr(curr, direction)
+            if not neighbour:
+                continue
+
+            if neighbour.is_door():
+                neighbour = neighbour.replacement_tile
+                if not neighbour:
+                    continue
+
+            if neighbour.tile_id in seen:
+                continue
+
+            seen.add(neighbour.tile_id)
+            newpos = (pos[0] + yinc, pos[1] + xinc)
+
+            if newpos in occupied:
+                conflicts.append(PositionConflict(neighbour.tile_id, newpos,
+                                                  occupied[newpos]))
+            else:
+                positions[neighbour.tile_id] = newpos
+                occupied[newpos] = neighbour.tile_id
+
+            queue.append((neighbour, newpos))
+
+    return positions, conflicts
+
+def normalize_positions(positions):
+    """
+    Shift tile positions so that the lowest Y and X values are both 0
+
+    :param dict positions: dict mapping tile IDs to (y, x) tuples
+    :return: new dict with shifted positions
+    :rtype: dict
+    """
+    if not positions:
+        return {}
+
+    lowest_y = min(pos[0] for pos in positions.values())
+    lowest_x = min(pos[1] for pos in positions.values())
+
+    return {tile_id: (pos[0] - lowest_y, pos[1] - lowest_x)
+            for tile_id, pos in positions.items()}